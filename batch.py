@@ -0,0 +1,172 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import format_oncue as fo
+import format_powerpoint as fp
+import highlight_blocks as hb
+import pdf_cache as pc
+import pptx_export as px
+import transcript_index as ti
+import transcript_ir as tir
+
+""" Headless Batch Processing """
+
+INPUT_EXTENSIONS = ('.pdf', '.txt')
+POWERPOINT_SUFFIX = '.ppt.txt'
+ONCUE_SUFFIX = '.oncue.txt'
+DECK_SUFFIX = '.pptx'
+
+
+def collect_inputs(patterns):
+    """ Expands directories and glob patterns into a sorted list of PDF and TXT files """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+        for path in candidates:
+            if (os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS)
+                    and not path.endswith((POWERPOINT_SUFFIX, ONCUE_SUFFIX))):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def read_transcript(path):
+    """ Returns the transcript text of a TXT file, or the highlighted text of a PDF """
+    if path.lower().endswith('.pdf'):
+        import pdf_intake as pd  # Only PDF inputs need PyMuPDF
+        return pd.extract_highlighted_text_with_coordinates(path)[0]
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def output_paths(path, output_dir=None):
+    """
+    The PowerPoint text, OnCue and PowerPoint deck output files for an input, beside it unless an output directory
+    is given
+    """
+    base = os.path.splitext(path)[0]
+    if output_dir:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return base + POWERPOINT_SUFFIX, base + ONCUE_SUFFIX, base + DECK_SUFFIX
+
+
+def witness_name(path):
+    """ The witness a deck cites when none is given, the input's file name without the extension """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def index_transcript(path, text):
+    """
+    Adds a transcript to the search index the GUI searches, under the file's content hash like a PDF imported there,
+    so a file already indexed by either is not indexed twice
+    """
+    digest = pc.file_digest(path)
+    if not ti.is_indexed(digest):
+        line_table = hb.text_line_table(text)
+        if line_table:
+            ti.add_transcript(digest, os.path.basename(path), line_table)
+
+
+def write_chunks(path, chunks):
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def process_file(path, output_dir=None, deck=False, witness=None):
+    """
+    Runs one transcript through intake and both formatters and writes the outputs, plus a .pptx deck when asked, and
+    adds it to the search index. The deck's slides cite witness, the input's file name when none is given.
+    Never raises, failures are reported in the returned summary entry.
+    """
+    entry = {'path': path, 'status': 'ok', 'outputs': [], 'timings': {}}
+    start = time.perf_counter()
+    try:
+        stage_start = time.perf_counter()
+        text = read_transcript(path)
+        entry['timings']['intake'] = time.perf_counter() - stage_start
+
+        powerpoint_path, oncue_path, deck_path = output_paths(path, output_dir)
+
+        # One parse feeds both formatters
+        stage_start = time.perf_counter()
+        transcript = tir.parse_transcript(text)
+        entry['timings']['parse'] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        index_transcript(path, text)
+        entry['timings']['index'] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        write_chunks(powerpoint_path, fp.stream_transcript_for_powerpoint(transcript))
+        entry['timings']['powerpoint'] = time.perf_counter() - stage_start
+        entry['outputs'].append(powerpoint_path)
+
+        stage_start = time.perf_counter()
+        write_chunks(oncue_path, fo.stream_transcript_for_oncue(transcript))
+        entry['timings']['oncue'] = time.perf_counter() - stage_start
+        entry['outputs'].append(oncue_path)
+
+        if deck:
+            stage_start = time.perf_counter()
+            entry['slides'] = px.write_transcript_deck(deck_path, transcript, witness or witness_name(path))
+            entry['timings']['deck'] = time.perf_counter() - stage_start
+            entry['outputs'].append(deck_path)
+    except Exception as err:
+        entry['status'] = 'failed'
+        entry['error'] = f"{type(err).__name__}: {err}"
+    entry['seconds'] = time.perf_counter() - start
+    return entry
+
+
+def run_batch(paths, workers=None, output_dir=None, deck=False, witness=None):
+    """ Processes the files across a process pool and returns the batch summary """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    if workers == 1 or len(paths) < 2:
+        entries = [process_file(path, output_dir, deck, witness) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries = list(executor.map(process_file, paths, [output_dir] * len(paths), [deck] * len(paths),
+                                        [witness] * len(paths)))
+    return {
+        'files': entries,
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format highlighted PDF and TXT transcripts without the GUI")
+    parser.add_argument("inputs", nargs="+", help="directories, files or glob patterns")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default=None, help="write outputs here instead of beside each input")
+    parser.add_argument("--summary", default="batch_summary.json", help="path of the JSON summary")
+    parser.add_argument("--pptx", action="store_true", help="also write a .pptx deck with one slide per highlight")
+    parser.add_argument("--witness", default=None,
+                        help="witness name the deck slides cite (default: each input's file name)")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.inputs)
+    summary = run_batch(paths, args.workers, args.output_dir, args.pptx, args.witness)
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    for entry in summary['files']:
+        if entry['status'] != 'ok':
+            print(f"FAILED {entry['path']}: {entry['error']}", file=sys.stderr)
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['seconds']:.2f}s "
+          f"(summary: {args.summary})")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
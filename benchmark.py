@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+""" Benchmarks and Synthetic Transcript Generators """
+
+LINES_PER_PAGE = 25
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LINE_NUMBER_X, TEXT_X, FIRST_LINE_Y, LINE_SPACING = 50, 90, 100, 26
+
+QUESTIONS = ("Q.  Where were you on the morning of March 3rd?", "Q.  Did you travel to Shanghai that year?",
+             "Q.  Who else attended the meeting?", "Q.  Can you describe the document in front of you?")
+ANSWERS = ("A.  I was at the office.", "A.  Yes, for about two weeks in the spring.",
+           "A.  I don't recall exactly.", "A.  It is a purchase agreement.")
+CONTINUATIONS = ("and the shipment had already left the warehouse by then", "before the second invoice was sent",
+                 "as far as I remember, but I would have to check", "with counsel for the other side present")
+OBJECTIONS = ("MR. SMITH:  Objection, form.", "MS. LEE:  Objection, foundation.", "MR. SMITH:  Join.")
+INTERJECTIONS = ("THE VIDEOGRAPHER:  We are going off the record.", "THE WITNESS:  Could you repeat that?",
+                 "BY MR. JONES:")
+REPORTER_BANNER = "ACME COURT REPORTING, INC.  (555) 010-2000  www.acme-reporting.example"
+
+
+def generate_transcript_pages(pages, seed=0):
+    """ Returns a list of pages, each a list of LINES_PER_PAGE transcript lines without line numbers """
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        lines = []
+        while len(lines) < LINES_PER_PAGE:
+            roll = rng.random()
+            if roll < 0.1:
+                lines.append(rng.choice(OBJECTIONS))
+            elif roll < 0.15:
+                lines.append(rng.choice(INTERJECTIONS))
+            else:
+                lines.append(rng.choice(QUESTIONS))
+                lines.extend(rng.choice(CONTINUATIONS) for _ in range(rng.randint(0, 2)))
+                lines.append(rng.choice(ANSWERS))
+                lines.extend(rng.choice(CONTINUATIONS) for _ in range(rng.randint(0, 2)))
+        result.append(lines[:LINES_PER_PAGE])
+    return result
+
+
+def generate_transcript_lines(pages, seed=0):
+    """ Returns the transcript as pasted from a PDF: one "N text" line per transcript line """
+    return [f"{line_number} {line}" for lines in generate_transcript_pages(pages, seed)
+            for line_number, line in enumerate(lines, 1)]
+
+
+def generate_transcript_text(pages, seed=0):
+    """ A full pasted transcript, including the page numbers and reporter banners between pages """
+    text_lines = []
+    for page_num, lines in enumerate(generate_transcript_pages(pages, seed), 1):
+        text_lines.append(f"Page {page_num}")
+        text_lines.extend(f"{line_number} {line}" for line_number, line in enumerate(lines, 1))
+        text_lines.append(REPORTER_BANNER)
+    return "\n".join(text_lines)
+
+
+def highlight_spans(rng, highlights_per_page):
+    """ Non-overlapping (first_row, last_row) spans, at most one per two rows of the page """
+    count = min(highlights_per_page, LINES_PER_PAGE // 2)
+    rows = sorted(rng.sample(range(LINES_PER_PAGE), 2 * count))
+    return [(rows[i], rows[i + 1]) for i in range(0, len(rows), 2)]
+
+
+def generate_raw_highlights(pages, highlights_per_page=1, seed=0):
+    """ (text, page_num) pairs laid out like get_text("text") of a highlight: each line number on its own line """
+    rng = random.Random(seed)
+    highlights = []
+    for page_num, lines in enumerate(generate_transcript_pages(pages, seed)):
+        for first, last in highlight_spans(rng, highlights_per_page):
+            text = "".join(f"{row + 1}\n{lines[row]}\n" for row in range(first, last + 1))
+            highlights.append((text, page_num))
+    return highlights
+
+
+def make_highlighted_pdf(path, pages, highlighted_pages=None, highlights_per_page=1, seed=0):
+    """
+    Writes a transcript PDF with a line-number gutter, a page number and reporter banner on every page, and
+    highlights_per_page highlights on each highlighted page. By default every page is highlighted.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    highlighted = set(range(pages) if highlighted_pages is None else highlighted_pages)
+    font = fitz.Font("helv")
+    doc = fitz.open()
+    for page_num, lines in enumerate(generate_transcript_pages(pages, seed)):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        writer = fitz.TextWriter(page.rect)
+        writer.append((PAGE_WIDTH - 100, 60), f"Page {page_num + 1}", font=font, fontsize=10)
+        for row, line in enumerate(lines):
+            y = FIRST_LINE_Y + row * LINE_SPACING
+            writer.append((LINE_NUMBER_X, y), f"{row + 1:>2}", font=font, fontsize=11)
+            writer.append((TEXT_X, y), line, font=font, fontsize=11)
+        writer.append((LINE_NUMBER_X, PAGE_HEIGHT - 40), REPORTER_BANNER, font=font, fontsize=9)
+        writer.write_text(page)
+        if page_num in highlighted:
+            for first, last in highlight_spans(rng, highlights_per_page):
+                quads = [fitz.Rect(LINE_NUMBER_X - 4, FIRST_LINE_Y + row * LINE_SPACING - 11,
+                                   PAGE_WIDTH - 50, FIRST_LINE_Y + row * LINE_SPACING + 3).quad
+                         for row in range(first, last + 1)]
+                page.add_highlight_annot(quads)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def best_time(fn, *args, repeat=3):
+    """ Best wall time of several runs, in seconds """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_extraction(pages, workers, repeat=3):
+    """ Times serial against parallel highlight extraction on a synthetic fully highlighted transcript """
+    import pdf_intake as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_highlighted_pdf(os.path.join(tmp, "synthetic.pdf"), pages)
+        serial = best_time(pd.extract_highlighted_text_with_coordinates, pdf_path, 1, repeat=repeat)
+        parallel = best_time(pd.extract_highlighted_text_with_coordinates, pdf_path, workers, repeat=repeat)
+        assert pd.extract_highlighted_text_with_coordinates(pdf_path, 1) == \
+            pd.extract_highlighted_text_with_coordinates(pdf_path, workers)
+    print(f"extraction, {pages} pages: serial {serial:.3f}s, {workers} workers {parallel:.3f}s, "
+          f"speedup {serial / parallel:.2f}x")
+
+
+def legacy_classify_line(line, conditions):
+    """ The per-line startswith scans phrase classification did before compile_conditions """
+    if line.startswith("BY") and ":" in line:
+        return "by"
+    if line.startswith("QUESTIONS BY") and ":" in line:
+        return "by"
+    if line.startswith("--- Page"):
+        return "page_header"
+    if any(line.startswith(phrase) for phrase in conditions['qa_phrases']):
+        return "qa"
+    if any(line.startswith(phrase) for phrase in conditions['objection_phrases'] + conditions['non_party_phrases']):
+        return "objection"
+    return None
+
+
+def bench_classification(line_count, repeat=3):
+    """ Lines per second of the startswith scans against the compiled classifier, and of process_lines """
+    import format_powerpoint as fp
+    import processing_functions as pf
+    from globals import conditions_dict as cd
+
+    lines = generate_transcript_lines(-(-line_count // LINES_PER_PAGE))[:line_count]
+    stripped = [pf.detect_page_numbers(line, pf.LINE_NUMBER_RE.match(line))['line'] for line in lines]
+    pattern = pf.compile_conditions(cd)
+
+    legacy = best_time(lambda: [legacy_classify_line(line, cd) for line in stripped], repeat=repeat)
+    compiled = best_time(lambda: [pf.classify_line(line, pattern) for line in stripped], repeat=repeat)
+    processing = best_time(fp.process_lines, lines, repeat=repeat)
+    print(f"classification, {line_count} lines: startswith scans {line_count / legacy:,.0f} lines/s, "
+          f"compiled {line_count / compiled:,.0f} lines/s ({legacy / compiled:.2f}x)")
+    print(f"process_lines, {line_count} lines: {line_count / processing:,.0f} lines/s")
+
+
+""" Startup Budget """
+
+LAZY_MODULES = ('fitz', 'pymupdf', 'pdf_intake', 'transcript_store')
+STARTUP_PROBE_ENV = "TRANSCRIPT_STARTUP_PROBE"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module="gui"):
+    """ {module: cumulative microseconds} from python -X importtime """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True)
+    profile = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def time_to_first_paint():
+    """ Seconds from launching main.py until its window has been shown and painted """
+    env = dict(os.environ, **{STARTUP_PROBE_ENV: repr(time.time())})
+    completed = subprocess.run([sys.executable, os.path.join(REPO_DIR, "main.py")], cwd=REPO_DIR, env=env,
+                               capture_output=True, text=True, check=True, timeout=60)
+    for line in completed.stdout.splitlines():
+        if line.startswith("first_paint "):
+            return float(line.split()[1])
+    raise RuntimeError(f"main.py did not report a first paint: {completed.stderr.strip()}")
+
+
+def bench_startup(runs, budget_ms, top):
+    """ Prints the slowest startup imports and fails when lazy modules load early or first paint is over budget """
+    profile = import_profile()
+    print("slowest imports of gui (cumulative):")
+    for name, microseconds in sorted(profile.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:<40} {microseconds / 1000:8.1f} ms")
+
+    status = 0
+    eager = [name for name in profile if name.split('.')[0] in LAZY_MODULES]
+    if eager:
+        print(f"FAIL: loaded at startup but should be lazy: {', '.join(sorted(eager))}")
+        status = 1
+
+    paints = [time_to_first_paint() for _ in range(runs)]
+    median = statistics.median(paints) * 1000
+    print(f"time to first paint: median {median:.0f} ms over {runs} runs (budget {budget_ms:.0f} ms)")
+    if median > budget_ms:
+        print("FAIL: time to first paint is over budget")
+        status = 1
+    return status
+
+
+""" Stage Suite and Baselines """
+
+SUITE_STAGES = ('extract_highlighted_text_with_coordinates', 'process_pdf_highlighted_text', 'process_lines',
+                'prepare_text_for_powerpoint', 'prepare_text_for_oncue', 'merge_designations')
+SUITE_DESIGNATIONS = 5000
+
+
+def generate_designations(count, pages, seed=0):
+    """ Random, partly overlapping designations of up to a page and a half, some crossing a page break """
+    import designations as dg
+
+    rng = random.Random(seed)
+    designations = []
+    for _ in range(count):
+        start_page, start_line = rng.randint(1, pages), rng.randint(1, LINES_PER_PAGE)
+        end = (start_page - 1) * LINES_PER_PAGE + start_line - 1 + rng.randint(0, 40)
+        designations.append(dg.Designation(start_page, start_line, end // LINES_PER_PAGE + 1,
+                                           end % LINES_PER_PAGE + 1))
+    return designations
+
+
+def run_suite(pages, highlights_per_page, repeat=3):
+    """ Times each pipeline stage separately on synthetic input, returns {stage: best seconds} """
+    import format_oncue as fo
+    import format_powerpoint as fp
+    import pdf_intake as pd
+
+    transcript_text = generate_transcript_text(pages)
+    designations = generate_designations(SUITE_DESIGNATIONS, pages)
+    raw_highlights = generate_raw_highlights(pages, highlights_per_page)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_highlighted_pdf(os.path.join(tmp, "synthetic.pdf"), pages,
+                                        highlights_per_page=highlights_per_page)
+        extraction = best_time(pd.extract_highlighted_text_with_coordinates, pdf_path, repeat=repeat)
+        highlighted_text = pd.extract_highlighted_text_with_coordinates(pdf_path)[0]
+
+    return {
+        'extract_highlighted_text_with_coordinates': extraction,
+        'process_pdf_highlighted_text': best_time(
+            lambda: [pd.process_pdf_highlighted_text(text, page_num) for text, page_num in raw_highlights],
+            repeat=repeat),
+        'process_lines': best_time(fp.process_lines, fp.split_and_preprocess_text(transcript_text), repeat=repeat),
+        'prepare_text_for_powerpoint': best_time(fp.prepare_text_for_powerpoint, transcript_text, repeat=repeat),
+        'prepare_text_for_oncue': best_time(fo.prepare_text_for_oncue, highlighted_text, repeat=repeat),
+        'merge_designations': best_time(lambda: "".join(fo.stream_designations(designations)), repeat=repeat),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """ Returns the stages that got slower than their baseline by more than the threshold fraction """
+    regressions = []
+    for stage in SUITE_STAGES:
+        previous = baseline['stages'].get(stage)
+        if previous and results[stage] > previous * (1 + threshold):
+            regressions.append(stage)
+    return regressions
+
+
+def bench_suite(pages, highlights_per_page, repeat, baseline_path, save_baseline, threshold):
+    """ Runs the stage suite, prints it against the baseline and returns the exit status """
+    results = run_suite(pages, highlights_per_page, repeat)
+    baseline = None
+    if baseline_path and os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if (baseline.get('pages'), baseline.get('highlights_per_page')) != (pages, highlights_per_page):
+            print(f"baseline {baseline_path} was recorded with different parameters, not comparing")
+            baseline = None
+
+    for stage in SUITE_STAGES:
+        line = f"{stage:<45} {results[stage] * 1000:10.2f} ms"
+        if baseline and baseline['stages'].get(stage):
+            line += f"   baseline {baseline['stages'][stage] * 1000:10.2f} ms " \
+                    f"({results[stage] / baseline['stages'][stage] - 1:+.0%})"
+        print(line)
+
+    if save_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': pages, 'highlights_per_page': highlights_per_page, 'stages': results}, f, indent=2)
+        print(f"baseline saved to {baseline_path}")
+        return 0
+
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, threshold)
+        if regressions:
+            print(f"REGRESSION (>{threshold:.0%} slower): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcript pipeline benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extraction = subparsers.add_parser("extraction", help="serial vs parallel PDF highlight extraction")
+    extraction.add_argument("--pages", type=int, default=1000)
+    extraction.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    extraction.add_argument("--repeat", type=int, default=3)
+
+    classification = subparsers.add_parser("classification", help="phrase classification throughput")
+    classification.add_argument("--lines", type=int, default=100000)
+    classification.add_argument("--repeat", type=int, default=3)
+
+    suite = subparsers.add_parser("suite", help="time every pipeline stage and compare with a JSON baseline")
+    suite.add_argument("--pages", type=int, default=400)
+    suite.add_argument("--highlights-per-page", type=int, default=2)
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--baseline", default="benchmark_baseline.json")
+    suite.add_argument("--save-baseline", action="store_true", help="record this run as the new baseline")
+    suite.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+
+    startup = subparsers.add_parser("startup", help="import profile and time-to-first-paint budget")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget-ms", type=float, default=1500)
+    startup.add_argument("--top", type=int, default=10, help="how many of the slowest imports to list")
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        return bench_startup(args.runs, args.budget_ms, args.top)
+    if args.command == "suite":
+        return bench_suite(args.pages, args.highlights_per_page, args.repeat, args.baseline, args.save_baseline,
+                           args.threshold)
+    if args.command == "extraction":
+        bench_extraction(args.pages, args.workers, args.repeat)
+    elif args.command == "classification":
+        bench_classification(args.lines, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import threading
+
+""" Cancelling Long-Running Work """
+
+
+class ExtractionCancelled(Exception):
+    """ Raised by an extraction whose CancelToken was cancelled """
+
+
+class CancelToken:
+    """
+    Lets another thread stop an extraction. The extraction checks the token between pages, so cancelling takes
+    effect once the page being read is done.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ExtractionCancelled("PDF import cancelled")
@@ -0,0 +1,223 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import batch
+import designations as dg
+import format_oncue as fo
+
+""" Designation Export Across Depositions """
+
+CSV_COLUMNS = ('deposition', 'designation', 'start_page', 'start_line', 'end_page', 'end_line', 'party', 'issue')
+
+
+def deposition_name(path):
+    """ The name a deposition is exported under when no other input shares it, its file name without the extension """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def folder_and_file_name(path):
+    path = os.path.abspath(path)
+    return os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+
+
+def deposition_names(paths):
+    """
+    {path: name} of the depositions exported together. Inputs that would share a name are told apart by their file
+    name (smith.pdf and smith.txt), then by their folder too (case_a/smith.pdf), then by their path below the folder
+    every input is in, so no two depositions share CSV rows, tags or an OnCue file.
+    """
+    names = {}
+    pending = list(dict.fromkeys(paths))
+    for level in (deposition_name, os.path.basename, folder_and_file_name):
+        candidates = {path: level(path) for path in pending}
+        counts = Counter(candidates.values())
+        taken = set(names.values())
+        pending = []
+        for path, name in candidates.items():
+            if counts[name] == 1 and name not in taken:
+                names[path] = name
+            else:
+                pending.append(path)
+    if pending:
+        # The same folder and file name in two places, e.g. two cases with a smith/ folder each
+        root = os.path.commonpath([os.path.abspath(path) for path in pending])
+        names.update((path, os.path.relpath(os.path.abspath(path), root)) for path in pending)
+    return names
+
+
+def tag_keys(path, name):
+    """ The tags file entries that tag a deposition: its name, plus its file name when its name is the plain one """
+    if name == deposition_name(path):
+        return name, os.path.basename(path)
+    return name,
+
+
+def read_tags(path):
+    """
+    Reads per-deposition tags from a CSV with deposition, party and issue columns, into {deposition: (party, issue)}.
+    The deposition may be given as its name or its file name, or as the name it is exported under when inputs
+    share a name, e.g. smith.pdf or case_a/smith.pdf. A missing column leaves that tag blank.
+    """
+    tags = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or 'deposition' not in reader.fieldnames:
+            raise ValueError(f"{path} needs a header row with a deposition column and party and/or issue columns")
+        for row in reader:
+            name = (row.get('deposition') or '').strip()
+            if name:
+                name = os.path.normpath(name)
+                tags[name] = ((row.get('party') or '').strip(), (row.get('issue') or '').strip())
+    return tags
+
+
+def read_designations(path):
+    """
+    The merged designations one deposition cites, in transcript order, the same ranges format_oncue renders for it.
+    Returns (path, designations, error), error being None on success, so a pool worker never raises.
+    """
+    try:
+        text = batch.read_transcript(path)
+        return path, dg.merge_designations(fo.scan_designations(text.split('\n'))), None
+    except Exception as err:
+        return path, [], f"{type(err).__name__}: {err}"
+
+
+def iter_depositions(paths, workers=None):
+    """ Yields read_designations results in input order, read across a process pool when there are several paths """
+    if workers == 1 or len(paths) < 2:
+        yield from map(read_designations, paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map yields in input order as soon as each result is ready, so writing starts with the first deposition
+        yield from executor.map(read_designations, paths)
+
+
+class DesignationWriter:
+    """
+    Writes designations as they arrive, one deposition at a time: every range as a row of one CSV for the whole case,
+    and, when an OnCue directory is given, each deposition's ranges as an OnCue import file named after it.
+    Only the deposition being written is held in memory.
+    """
+
+    def __init__(self, csv_path=None, oncue_dir=None):
+        self.oncue_dir = oncue_dir
+        self.rows = 0
+        self._csv_file = None
+        self._csv = None
+        if csv_path:
+            self._csv_file = open(csv_path, 'w', encoding='utf-8', newline='')
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(CSV_COLUMNS)
+        if oncue_dir:
+            os.makedirs(oncue_dir, exist_ok=True)
+
+    def oncue_path(self, deposition):
+        # Names told apart by their folder keep it as a subfolder
+        return os.path.join(self.oncue_dir, deposition + batch.ONCUE_SUFFIX)
+
+    def write(self, deposition, designations, party="", issue=""):
+        """ Writes one deposition's designations, returns the OnCue file written or None """
+        if self._csv is not None:
+            self._csv.writerows((deposition, designation.render(), *designation, party, issue)
+                                for designation in designations)
+        self.rows += len(designations)
+        if not self.oncue_dir:
+            return None
+        path = self.oncue_path(deposition)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        batch.write_chunks(path, fo.stream_designations(designations))
+        return path
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_designations(paths, csv_path=None, oncue_dir=None, tags=None, default_tags=("", ""), workers=None):
+    """
+    Exports the designations of every deposition in one run and returns the export summary.
+    Every deposition is exported under its deposition_names name. tags maps a name or file name to its (party, issue)
+    CSV tags, depositions it does not list get default_tags.
+    A deposition that fails to read is reported in the summary and skipped.
+    """
+    tags = tags or {}
+    names = deposition_names(paths)
+    start = time.perf_counter()
+    entries = []
+    with DesignationWriter(csv_path, oncue_dir) as writer:
+        for path, designations, error in iter_depositions(paths, workers):
+            entry = {'path': path, 'deposition': names[path]}
+            if error is None:
+                entry['status'] = 'ok'
+                entry['designations'] = len(designations)
+                keys = [key for key in tag_keys(path, entry['deposition']) if key in tags]
+                party, issue = tags[keys[0]] if keys else default_tags
+                output = writer.write(entry['deposition'], designations, party, issue)
+                if output:
+                    entry['output'] = output
+            else:
+                entry['status'] = 'failed'
+                entry['error'] = error
+            entries.append(entry)
+        rows = writer.rows
+    return {
+        'depositions': entries,
+        'designations': rows,
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the designations of many depositions in one run")
+    parser.add_argument("inputs", nargs="+", help="directories, files or glob patterns")
+    parser.add_argument("--csv", default="designations.csv", help="path of the CSV holding every designation")
+    parser.add_argument("--oncue-dir", default=None, help="also write one OnCue import file per deposition here")
+    parser.add_argument("--tags", default=None,
+                        help="CSV with deposition, party and issue columns tagging each deposition's rows")
+    parser.add_argument("--party", default="", help="party tag of the depositions the tags file does not list")
+    parser.add_argument("--issue", default="", help="issue tag of the depositions the tags file does not list")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    paths = batch.collect_inputs(args.inputs)
+    tags = {}
+    if args.tags:
+        try:
+            tags = read_tags(args.tags)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
+        names = deposition_names(paths)
+        unknown = set(tags) - {key for path, name in names.items() for key in tag_keys(path, name)}
+        for name in sorted(unknown):
+            shared = sorted(names[path] for path in paths if name in (deposition_name(path), os.path.basename(path)))
+            if shared:
+                print(f"WARNING {args.tags} tags {name}, which several inputs share, name one of "
+                      f"{', '.join(shared)} instead", file=sys.stderr)
+            else:
+                print(f"WARNING {args.tags} tags {name}, which is not among the inputs", file=sys.stderr)
+    summary = export_designations(paths, args.csv, args.oncue_dir, tags, (args.party, args.issue), args.workers)
+
+    for entry in summary['depositions']:
+        if entry['status'] != 'ok':
+            print(f"FAILED {entry['path']}: {entry['error']}", file=sys.stderr)
+    print(f"{summary['designations']} designations from {summary['succeeded']} depositions, "
+          f"{summary['failed']} failed in {summary['seconds']:.2f}s (CSV: {args.csv})")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import re
+from operator import itemgetter
+
+""" Designation Model """
+
+LINES_PER_PAGE = 25
+DESIGNATION_RE = re.compile(r'(\d+):(\d+)-(\d+)(?::(\d+))?:?$')
+
+
+class Designation(tuple):
+    """
+    A transcript range from start page:line to end page:line, inclusive.
+    Tuple-backed, so designations sort in transcript order and cost no more memory than a 4-tuple.
+    """
+    __slots__ = ()
+
+    start_page = property(itemgetter(0))
+    start_line = property(itemgetter(1))
+    end_page = property(itemgetter(2))
+    end_line = property(itemgetter(3))
+
+    def __new__(cls, start_page, start_line, end_page, end_line):
+        return tuple.__new__(cls, (start_page, start_line, end_page, end_line))
+
+    def __getnewargs__(self):
+        # Lets designations be pickled, e.g. returned from a process pool worker
+        return tuple(self)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parses "12:3-9" (one page) or "12:20-13:4" (spanning a page break), with or without a trailing colon.
+        Returns None when the text is not a designation, including a range that ends before it starts.
+        """
+        match = DESIGNATION_RE.match(text.strip())
+        if match is None:
+            return None
+        start_page, start_line, end, end_line = match.groups()
+        if end_line is None:
+            designation = cls(int(start_page), int(start_line), int(start_page), int(end))
+        else:
+            designation = cls(int(start_page), int(start_line), int(end), int(end_line))
+        if designation.start > designation.end:
+            return None
+        return designation
+
+    @property
+    def start(self):
+        return self[0], self[1]
+
+    @property
+    def end(self):
+        return self[2], self[3]
+
+    def render(self):
+        """ OnCue form: "12:3-9" on one page, "12:20-13:4" across pages """
+        if self[0] == self[2]:
+            return f"{self[0]}:{self[1]}-{self[3]}"
+        return f"{self[0]}:{self[1]}-{self[2]}:{self[3]}"
+
+    def __repr__(self):
+        return f"Designation({self.render()})"
+
+
+def next_position(page, line, lines_per_page=LINES_PER_PAGE):
+    """ The page:line that follows page:line, rolling over to line 1 of the next page """
+    if line >= lines_per_page:
+        return page + 1, 1
+    return page, line + 1
+
+
+def merge_designations(designations, lines_per_page=LINES_PER_PAGE):
+    """
+    Sorts designations and coalesces the ones that overlap or are adjacent, including across page breaks,
+    so no clip is played twice. O(n log n).
+    """
+    merged = []
+    for designation in sorted(designations):
+        if merged:
+            start_page, start_line, end_page, end_line = merged[-1]
+            if designation.start <= next_position(end_page, end_line, lines_per_page):
+                if designation.end > (end_page, end_line):
+                    merged[-1] = Designation(start_page, start_line, designation[2], designation[3])
+                continue
+        merged.append(designation)
+    return merged
@@ -1,23 +1,62 @@
-import re
+import designations as dg
+import tracing
 
 """ Prepare Text for OnCue """
 
-def sort_key(s):
-    """ Sort designations"""
-    page, lines = s.split(':')
-    start_line, end_line = map(int, lines.split('-'))
-    return int(page), start_line
+def designation_token(token):
+    """ Returns the Designation a whitespace-separated cite token such as "12:3-9:" carries, or None """
+    token = token.strip()  # Strips any white-space at the beginning or end of a line
+    if token.endswith(":"):
+        return dg.Designation.parse(token)
+    return None
 
-def prepare_text_for_oncue(text):
-    matches = []
-    lines = text.split()
-    for i, line in enumerate(lines):
-        line = line.strip()  # Strips any white-space at the beginning or end of a line
-        match = re.match(r'\d+:\d+-\d+:', line)
 
-        if match:
-            matches.append(line.rstrip(":"))
+def stream_designations(designations):
+    """
+    Yields the OnCue output for the designations, one chunk per line.
+    Overlapping and adjacent designations are merged, including across page breaks.
+    """
+    for i, designation in enumerate(dg.merge_designations(designations)):
+        yield designation.render() if i == 0 else "\n" + designation.render()
+
+
+def scan_designations(lines):
+    """ Yields every designation cited in any iterable of lines, unmerged, in the order they appear """
+    for line in lines:
+        for token in line.split():
+            designation = designation_token(token)
+            if designation:
+                yield designation
+
+
+def stream_text_for_oncue(lines):
+    """
+    Streaming variant of prepare_text_for_oncue.
+    Accepts any iterable of lines, such as an open file, and only keeps the designations in memory.
+    """
+    return stream_designations(list(scan_designations(lines)))
+
 
-    sorted_matches = sorted(matches, key=sort_key)
-    processed_text = "\n".join(sorted_matches)
+def stream_transcript_for_oncue(transcript):
+    """
+    Streaming variant of render_oncue, accepts any iterable of transcript_ir.TranscriptLine.
+    """
+    return stream_designations([designation for transcript_line in transcript
+                                for designation in transcript_line.designations])
+
+
+def render_oncue(transcript):
+    """
+    Renders a parsed transcript (a list of transcript_ir.TranscriptLine) for OnCue, without re-scanning its text.
+    """
+    with tracing.stage("oncue.render") as span:
+        processed_text = "".join(stream_transcript_for_oncue(transcript))
+        span.set(designations=processed_text.count("\n") + 1 if processed_text else 0)
+    return processed_text
+
+
+def prepare_text_for_oncue(text):
+    with tracing.stage("oncue.prepare") as span:
+        processed_text = "".join(stream_text_for_oncue([text]))
+        span.set(designations=processed_text.count("\n") + 1 if processed_text else 0)
     return processed_text
@@ -1,6 +1,6 @@
-import re
 import processing_functions as pf
-from globals import conditions_dict as cd
+import tracing
+import transcript_ir as tir
 
 """ Prepare Text for Powerpoint """
 
@@ -14,43 +14,60 @@ def split_and_preprocess_text(text):
     return preprocessed_lines
 
 
-def process_lines(lines):
-    """
-    Processes each line for page numbers, word replacements, line filtering, and phrase assembly.
-    """
-    first_num, last_num, capitalize = None, None, False
-    phrase_being_assembled = ""
-    completed_line_groups = []
+def new_block_state():
+    """ The state phrase assembly starts from and carries from one line to the next """
+    return {'first_num': None, 'last_num': None, 'capitalize': False, 'phrase_being_assembled': ""}
 
-    for line in lines:
-        # Replace words
-        line = pf.replace_words(line, cd['swap_phrase_dict'])
 
-        # Detect page numbers
-        match = re.match(r'(\d+)\s*', line)
-        result = pf.detect_page_numbers(line, match)
-        num = result['num']
-        line = result['line']
+def iter_transcript_groups(transcript, state):
+    """
+    Yields completed line groups as phrase assembly finishes them, updating state as it goes.
+    transcript is any iterable of transcript_ir.TranscriptLine. The phrase still being assembled when the lines run
+    out is left in state.
+    """
+    for transcript_line in transcript:
+        num = transcript_line.number
         # Check if a page number was detected and the line has content
         if num is not None:
             # Now, we also check if it's the first number to be found
-            if first_num is None:
+            if state['first_num'] is None:
                 # If first_num is None, set it to num - 1, ensuring num is not the first page (i.e., num > 1)
                 # This adjustment is to handle cases where num might be 1 (the first page), and subtracting 1 would make it 0 or negative
-                first_num = max(1, num)
-            last_num = num
+                state['first_num'] = max(1, num)
+            state['last_num'] = num
 
         # Filter lines
-        line = pf.filter_lines(line, match)
-        if line is None:
+        kind = transcript_line.kind
+        if kind == pf.LINE_BY:
             continue
+        line = "\n\n" + transcript_line.text + "\n" if kind == pf.LINE_PAGE_HEADER else transcript_line.text
 
         # Assemble phrases
-        phrase_being_assembled, new_completed_line_groups, capitalize = pf.assemble_phrases(
-            line, cd['qa_phrases'], cd['objection_phrases'], cd['non_party_phrases'], capitalize,
-            phrase_being_assembled
-        )
-        completed_line_groups.extend(new_completed_line_groups)
+        state['phrase_being_assembled'], new_completed_line_groups, state['capitalize'] = \
+            pf.assemble_classified_phrase(line, kind, state['capitalize'], state['phrase_being_assembled'])
+        yield from new_completed_line_groups
+
+
+def process_transcript_block(transcript):
+    """
+    Runs phrase assembly over a run of TranscriptLines starting from a fresh state.
+    Returns the completed line groups together with the phrase still being assembled, its capitalize flag and
+    the first and last line numbers seen, so callers can splice several blocks together.
+    """
+    state = new_block_state()
+    completed_line_groups = list(iter_transcript_groups(transcript, state))
+    return (completed_line_groups, state['phrase_being_assembled'], state['capitalize'], state['first_num'],
+            state['last_num'])
+
+
+def process_transcript(transcript):
+    """
+    Phrase assembly over a whole parsed transcript, returns the completed line groups and the first and last line
+    numbers.
+    """
+    with tracing.stage("powerpoint.process_lines", lines=len(transcript)):
+        completed_line_groups, phrase_being_assembled, capitalize, first_num, last_num = \
+            process_transcript_block(transcript)
 
     if phrase_being_assembled:
         completed_line_groups.append(phrase_being_assembled.upper() if capitalize else phrase_being_assembled)
@@ -58,20 +75,90 @@ def process_lines(lines):
     return completed_line_groups, first_num, last_num
 
 
+def process_lines(lines, conditions=None):
+    """
+    Processes each line for page numbers, word replacements, line filtering, and phrase assembly.
+    """
+    return process_transcript(list(tir.iter_transcript(lines, conditions)))
+
+
+def cite_line(first_num, last_num, witness_name_text="Jimmy", page=None):
+    """
+    The transcript cite closing the output, the page is left blank for the user to fill in when unknown.
+    """
+    return '{} Tr. Pg. {}, Ln. {}-{}'.format(witness_name_text, "__" if page is None else page, first_num, last_num)
+
+
 def finalize_and_format(completed_line_groups, first_num, last_num, witness_name_text="Jimmy" ):
     """
     Finalizes and formats the output.
     """
     # You might have additional processing here based on your requirements
     formatted_output = pf.format_output(completed_line_groups, first_num, last_num)
-    formatted_output += '\n\n{} Tr. Pg. __, Ln. {}-{}'.format(witness_name_text, first_num, last_num)
+    formatted_output += '\n\n' + cite_line(first_num, last_num, witness_name_text)
     return formatted_output
 
 
-def prepare_text_for_powerpoint(text):
+def render_powerpoint(transcript, witness_name_text="Jimmy"):
+    """
+    Renders a parsed transcript (a list of transcript_ir.TranscriptLine) for PowerPoint.
+    """
+    completed_line_groups, first_num, last_num = process_transcript(transcript)
+    return finalize_and_format(completed_line_groups, first_num, last_num, witness_name_text)
+
+
+def prepare_text_for_powerpoint(text, conditions=None):
     """
     Prepares text for PowerPoint presentation.
     """
-    preprocessed_lines = split_and_preprocess_text(text)
-    completed_line_groups, first_num, last_num = process_lines(preprocessed_lines)
-    return finalize_and_format(completed_line_groups, first_num, last_num)
+    return render_powerpoint(tir.parse_transcript(text, conditions))
+
+
+""" Streaming Output """
+
+
+def strip_chunks(chunks):
+    """
+    Yields the chunks with the leading and trailing whitespace of their concatenation removed, holding back only
+    whitespace, so the result matches ''.join(chunks).strip().
+    """
+    started = False
+    pending_whitespace = ""
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            yield pending_whitespace + body
+            pending_whitespace = chunk[len(body):]
+        else:
+            pending_whitespace += chunk
+
+
+def stream_transcript_for_powerpoint(transcript, witness_name_text="Jimmy"):
+    """
+    Streaming variant of render_powerpoint.
+    Accepts any iterable of TranscriptLines and yields output chunks as phrases complete.
+    """
+    state = new_block_state()
+
+    def completed_line_groups():
+        yield from iter_transcript_groups(transcript, state)
+        phrase_being_assembled = state['phrase_being_assembled']
+        if phrase_being_assembled:
+            yield phrase_being_assembled.upper() if state['capitalize'] else phrase_being_assembled
+
+    yield from strip_chunks(completed_line_groups())
+    yield '\n\n' + cite_line(state['first_num'], state['last_num'], witness_name_text)
+
+
+def stream_text_for_powerpoint(lines, witness_name_text="Jimmy", conditions=None):
+    """
+    Streaming variant of prepare_text_for_powerpoint.
+    Accepts any iterable of lines, such as an open file, and yields output chunks as phrases complete,
+    so memory stays flat however long the transcript is.
+    """
+    return stream_transcript_for_powerpoint(tir.iter_transcript(lines, conditions), witness_name_text)
@@ -1,6 +1,4 @@
-pdf_path = None
-imported_text = None
-
+# The default rule set, every TranscriptSession works on its own copy
 conditions_dict = {
     "qa_phrases" : ["Q.", "A."],
     "objection_phrases" : ["MR", "MS", "MRS", "ATTY", "ATTORNEY"],
@@ -1,16 +1,19 @@
+import os
 import re
 import sys
-import fitz #pymupdf
+from functools import partial
 import metadata as meta
-import pdf_intake as pd
+import pdf_cache as pc  # Loads PyMuPDF lazily, on the first PDF import
 import processing_functions as pl
-import format_powerpoint as fp
-import format_oncue as fo
-import globals as gb
-from PyQt5.QtCore import pyqtSlot, QTimer
-from PyQt5.QtGui import QFont, QIcon
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QTextEdit, QPushButton, QVBoxLayout, QHBoxLayout,\
-                               QCheckBox,QLabel, QSpacerItem, QSizePolicy, QLineEdit, QFileDialog, QMessageBox
+import session as ss
+import text_panes as tp
+import tracing
+import workers as wk
+from PyQt5.QtCore import pyqtSlot, QTimer, QThread, QThreadPool
+from PyQt5.QtGui import QFont, QIcon, QTextCursor
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QPlainTextEdit, QPushButton, QVBoxLayout, QHBoxLayout,\
+                               QCheckBox,QLabel, QSpacerItem, QSizePolicy, QLineEdit, QFileDialog, QMessageBox, QTabBar, \
+                               QProgressBar
 
 light_stylesheet = """
 QPushButton {
@@ -22,7 +25,7 @@ QPushButton {
 QLabel {
     padding: 10px;
 }
-QTextEdit {
+QPlainTextEdit {
     background-color: #ffffff;
     border-radius: 8px;
     padding: 10px;
@@ -51,7 +54,7 @@ QLineEdit {
 QPushButton:pressed {
   background: #64407C;
 }
-QTextEdit {
+QPlainTextEdit {
     background-color: #2b2b2b;
     border-radius: 8px;
     color: #F7F8FA;
@@ -64,6 +67,12 @@ QWidget {
 }
 """
 
+PROCESSING_DEBOUNCE_MS = 150
+MAX_SEARCH_TABS = 10  # Depositions with hits beyond this are only counted in the status area
+STATUS_STAGES = ("pdf.index", "pdf.extract", "transcript.parse", "powerpoint.process_blocks", "oncue.render",
+                 "gui.process", "gui.set_output_text")
+
+
 class TextProcessorApp(QWidget):
     def __init__(self):
         super().__init__()
@@ -71,19 +80,34 @@ class TextProcessorApp(QWidget):
         self.build_number = None
         self.clear_button = None
         self.copy_oncue_button = None
+        self.save_deck_button = None
         self.copy_powerpoint_button = None
         self.copyright_label = None
         self.footer_text = None
+        self.status_label = None
         self.hide_names_checkbox = None
         self.hide_objections_checkbox = None
         self.load_pdf_button = None
         self.name_edit = None
+        self.search_edit = None
+        self.search_status_label = None
+        self.search_generation = 0
         self.name_label = None
         self.text_box_bottom_right = None
         self.text_box_left = None
         self.text_box_right = None
         self.text_box_top_right = None
         self.text_box_top_right_label = None
+        self.top_right_writer = None
+        self.bottom_right_writer = None
+        self.new_tab_button = None
+        self.import_progress_bar = None
+        self.cancel_import_button = None
+        self.tab_bar = None
+        self.sessions = []
+        self.session = None
+        self.processing_timer = None
+        self.thread_pool = None
         # self.toggle_dark_mode(False)
         self.init_ui()
 
@@ -94,6 +118,17 @@ class TextProcessorApp(QWidget):
         # SETUP UI
         ###########################################
         self.setWindowIcon(QIcon('corelogo80.png'))  # Set window icon
+
+        ''' BACKGROUND PROCESSING '''
+
+        # Sessions share no state, so depositions import and process side by side, one thread per core
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max(2, QThread.idealThreadCount()))
+        # Bursts of edits are coalesced into a single run once typing pauses
+        self.processing_timer = QTimer(self)
+        self.processing_timer.setSingleShot(True)
+        self.processing_timer.setInterval(PROCESSING_DEBOUNCE_MS)
+        self.processing_timer.timeout.connect(self.start_processing)
         self.spacer_top = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
         self.spacer_bottom = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
 
@@ -116,6 +151,42 @@ class TextProcessorApp(QWidget):
         self.load_pdf_button.setStyleSheet("QPushButton {padding: 8px; }")
         self.load_pdf_button.clicked.connect(self.gui_load_highlighted_pdf)
 
+        '''CREATE WORKSPACE TABS'''
+
+        # One tab per open deposition, each backed by its own TranscriptSession
+        self.tab_bar = QTabBar()
+        self.tab_bar.setTabsClosable(True)
+        self.tab_bar.setExpanding(False)
+        self.tab_bar.currentChanged.connect(self.on_tab_changed)
+        self.tab_bar.tabCloseRequested.connect(self.close_session)
+        self.new_tab_button = QPushButton('New Tab')
+        self.new_tab_button.setStyleSheet("QPushButton {padding: 8px; }")
+        self.new_tab_button.clicked.connect(self.new_session)
+
+        '''CREATE IMPORT PROGRESS'''
+
+        # Only shown while the current tab is importing a PDF
+        self.import_progress_bar = QProgressBar()
+        self.import_progress_bar.setFormat("Page %v of %m")
+        self.import_progress_bar.hide()
+        self.cancel_import_button = QPushButton('Cancel Import')
+        self.cancel_import_button.setStyleSheet("QPushButton {padding: 8px; }")
+        self.cancel_import_button.clicked.connect(self.cancel_import)
+        self.cancel_import_button.hide()
+
+        '''CREATE SEARCH BOX'''
+
+        # Searches the index of every transcript imported, pasted or run through batch.py and watch.py so far, the hits
+        # open as tabs of their own
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search all transcripts")
+        self.search_edit.setToolTip("Searches every PDF imported, text pasted into a tab, and transcript processed "
+                                    "by batch.py or watch.py")
+        self.search_edit.setStyleSheet("QLineEdit {padding: 8px; }")
+        self.search_edit.returnPressed.connect(self.start_search)
+        # The hit count of the latest search, the status area keeps showing the stage timings
+        self.search_status_label = QLabel("")
+
         # '''CREATE DARK MODE TOGGLE'''
         #
         # self.dark_mode_switch = QCheckBox("Dark Mode", self)
@@ -147,11 +218,14 @@ class TextProcessorApp(QWidget):
         '''CREATE MAIN TEXT BOXES'''
 
         # Text boxes for input and output
-        self.text_box_left = QTextEdit()
+        self.text_box_left = QPlainTextEdit()
         self.text_box_left.setPlaceholderText("Paste PDF or TXT Transcript lines")
         self.text_box_top_right_label = QLabel("PowerPoint Format")
-        self.text_box_top_right = QTextEdit()
-        self.text_box_bottom_right = QTextEdit()
+        self.text_box_top_right = QPlainTextEdit()
+        self.text_box_bottom_right = QPlainTextEdit()
+        # Large outputs are laid out a chunk at a time so the window keeps painting
+        self.top_right_writer = tp.PaneWriter(self.text_box_top_right)
+        self.bottom_right_writer = tp.PaneWriter(self.text_box_bottom_right)
 
         '''CREATE CLEAR BUTTON'''
 
@@ -171,10 +245,23 @@ class TextProcessorApp(QWidget):
         self.copy_oncue_button.setStyleSheet("QPushButton {padding: 8px; }")
         self.copy_oncue_button.clicked.connect(self.copy_bottom_right_to_clipboard)
 
+        '''CREATE SAVE DECK BUTTON'''
+
+        self.save_deck_button = QPushButton('Save PowerPoint Deck')
+        self.save_deck_button.setStyleSheet("QPushButton {padding: 8px; }")
+        self.save_deck_button.clicked.connect(self.save_powerpoint_deck)
+
         '''CREATE COPYRIGHT AND FOOTER TEXT'''
 
         self.footer_text = QLabel(f"{meta.copyright_info}\nBuild: {meta.build_number}")
 
+        '''CREATE STATUS READOUT'''
+
+        # Latest stage timings, recorded by the tracing hooks in the pipeline modules
+        tracing.enable()
+        self.status_label = QLabel("")
+        self.status_label.setWordWrap(True)
+
         ###########################################
         # FORMATTING
         ###########################################
@@ -185,9 +272,9 @@ class TextProcessorApp(QWidget):
         font.setPointSize(14)
         self.text_box_top_right.setFont(font)
         self.text_box_bottom_right.setFont(font)
-        self.text_box_left.setAcceptRichText(False)
-        self.text_box_top_right.setAcceptRichText(False)
-        self.text_box_bottom_right.setAcceptRichText(False)
+        # Output panes are rewritten on every change, an undo history would only grow
+        self.text_box_top_right.setUndoRedoEnabled(False)
+        self.text_box_bottom_right.setUndoRedoEnabled(False)
         self.text_box_left.setFont(font)
 
         ###########################################
@@ -197,6 +284,9 @@ class TextProcessorApp(QWidget):
         ''' ADD TOP ELEMENTS TO CONTAINERS'''
 
         top_hbox.addWidget(self.load_pdf_button)
+        top_hbox.addWidget(self.new_tab_button)
+        top_hbox.addWidget(self.import_progress_bar)
+        top_hbox.addWidget(self.cancel_import_button)
         top_hbox.addSpacerItem(self.spacer_top)
         # top_hbox.addWidget(self.dark_mode_switch)
         top_hbox.addWidget(self.hide_depo_name_checkbox)
@@ -218,13 +308,17 @@ class TextProcessorApp(QWidget):
         ''' ADD EXPORT BUTTONS TO CONTAINERS'''
 
         button_hbox.addWidget(self.clear_button)
+        button_hbox.addWidget(self.search_edit)
+        button_hbox.addWidget(self.search_status_label)
         button_hbox.addSpacerItem(self.spacer_bottom)
         button_hbox.addWidget(self.copy_powerpoint_button)
         button_hbox.addWidget(self.copy_oncue_button)
+        button_hbox.addWidget(self.save_deck_button)
 
         ''' ADD FOOTER TEXT TO CONTAINERS '''
 
         label_hbox.addWidget(self.footer_text)
+        label_hbox.addWidget(self.status_label, stretch=1)
 
         ###########################################
         # ADD LAYOUTS TO LARGER CONTAINER
@@ -232,6 +326,7 @@ class TextProcessorApp(QWidget):
 
         # Finalize the layout setup
         total_vbox.addLayout(top_hbox)
+        total_vbox.addWidget(self.tab_bar)
         total_vbox.addLayout(hbox)  # This now contains the left text box and the stacked right text boxes
         total_vbox.addLayout(button_hbox)
         total_vbox.addLayout(label_hbox)
@@ -244,6 +339,7 @@ class TextProcessorApp(QWidget):
         self.setWindowTitle('Core Transcript Cleaner')
         self.resize(1200, 1000)
         self.text_box_left.textChanged.connect(self.on_text_change)
+        self.new_session()
 
     # def toggle_dark_mode(self, enabled):
     #     if enabled:
@@ -251,26 +347,200 @@ class TextProcessorApp(QWidget):
     #     else:
     #         self.setStyleSheet(light_stylesheet)  # Set to default or light mode stylesheet
 
+    ''' SESSIONS '''
+
+    def new_session(self):
+        """ Opens an empty deposition in a new tab and switches to it """
+        session = ss.TranscriptSession()
+        index = self.add_session(session)
+        self.tab_bar.setCurrentIndex(index)
+        return session
+
+    def add_session(self, session):
+        """ Adds a tab for the session, it only becomes current when it is the first one """
+        self.sessions.append(session)
+        # Adding the first tab makes it current, which already switched the panes to it
+        return self.tab_bar.addTab(session.name)
+
+    def on_tab_changed(self, index):
+        """ Shows the stored input and outputs of the selected session, nothing is reprocessed """
+        if index < 0:
+            return
+        previous = self.session
+        if previous is not None and previous in self.sessions:
+            previous.input_text = self.text_box_left.toPlainText()
+            if self.processing_timer.isActive():
+                # Edits still waiting on the debounce belong to the session being left
+                self.processing_timer.stop()
+                self.start_processing(previous)
+        self.session = self.sessions[index]
+        self.set_left_text_quietly(self.session.input_text)
+        self.top_right_writer.set_text(self.session.output_powerpoint)
+        self.bottom_right_writer.set_text(self.session.output_oncue)
+        self.update_import_widgets()
+
+    def close_session(self, index):
+        session = self.sessions[index]
+        session.cancel_import()
+        # Results still in flight for the closed session are dropped
+        session.processing_generation += 1
+        session.import_generation += 1
+        if session is self.session:
+            self.processing_timer.stop()
+            self.session = None
+        self.sessions.pop(index)
+        self.tab_bar.removeTab(index)
+        if not self.sessions:
+            self.new_session()
+
     def gui_load_highlighted_pdf(self):
         # Prompt the user to select a PDF file
         pdf_path, _ = QFileDialog.getOpenFileName(self, "Open PDF", "", "PDF files (*.pdf);;All files (*)")
-        gb.pdf_path = pdf_path
-        self.gui_add_input_text()
+        if not pdf_path:
+            return
+        # A deposition already in use keeps its tab, the PDF opens in a new one
+        session = self.session if self.session.is_empty() else self.new_session()
+        session.set_pdf(pdf_path)
+        self.tab_bar.setTabText(self.sessions.index(session), session.name)
+        # A fresh import re-hashes the file, so a PDF changed in place is never served stale. An unchanged one comes
+        # back from the transcript store, later edits and toggles from the memory cache
+        pc.invalidate(pdf_path)
+        self.gui_add_input_text(session)
         # return pdf_path
 
-    def aggregate_processed_pdf_text(self, pdf_path):
-        if pdf_path:
-            # Call the function to extract highlighted text and populate the left text field
-            result = pd.extract_highlighted_text_with_coordinates(gb.pdf_path)
-            highlighted_text = result[0]
-            citations = result[1]
-            return highlighted_text
+    def gui_add_input_text(self, session):
+        # Extract on a worker thread, pages stream into the session's text as they finish
+        cancel_token = session.start_import()
+        if session is self.session:
+            self.set_left_text_quietly("")
+        worker = wk.ProgressWorker(session.import_generation, session.import_pdf, session.pdf_path,
+                                   cancel=cancel_token)
+        worker.signals.progress.connect(partial(self.on_import_progress, session))
+        worker.signals.finished.connect(partial(self.on_import_finished, session))
+        worker.signals.failed.connect(partial(self.on_import_failed, session))
+        self.update_import_widgets()
+        self.thread_pool.start(worker)
+
+    def set_left_text_quietly(self, text):
+        """ Sets the left pane without triggering a processing run """
+        self.text_box_left.blockSignals(True)
+        self.text_box_left.setPlainText(text)
+        self.text_box_left.blockSignals(False)
+
+    def on_import_progress(self, session, generation, payload):
+        if generation != session.import_generation:
+            return
+        pages_done, pages_total, partial_text = payload
+        session.import_progress = (pages_done, pages_total)
+        session.input_text += partial_text
+        if session is self.session:
+            # Appended without a processing run, the complete text is processed once the import finishes
+            cursor = QTextCursor(self.text_box_left.document())
+            cursor.movePosition(QTextCursor.End)
+            self.text_box_left.blockSignals(True)
+            cursor.insertText(partial_text)
+            self.text_box_left.blockSignals(False)
+            self.update_import_widgets()
+
+    def on_import_failed(self, session, generation, message):
+        if generation != session.import_generation:
+            return
+        cancelled = session.cancel_token.cancelled
+        pages_done, pages_total = session.import_progress
+        session.end_import()
+        if session not in self.sessions:
+            return
+        if session is self.session:
+            self.update_import_widgets()
+        # The pages read before the cancel or failure stay, as text of their own rather than as the PDF, so later
+        # edits never go back to the PDF
+        session.pdf_path = None
+        if cancelled:
+            self.status_label.setText(f"Import of {session.name} cancelled after {pages_done} of {pages_total} pages")
         else:
-            return self.text_box_left.toPlainText()
-
-    def gui_add_input_text(self):
-        self.text_box_left.setPlainText(self.aggregate_processed_pdf_text(gb.pdf_path))
-
+            session.name = ss.untitled_name()
+            self.tab_bar.setTabText(self.sessions.index(session), session.name)
+            self.on_processing_failed(generation, message)
+        if session is self.session:
+            self.on_text_change()
+        elif session in self.sessions:
+            session.processing_generation += 1
+            self.start_processing(session)
+
+    def start_search(self):
+        query = self.search_edit.text().strip()
+        if not query:
+            return
+        self.search_generation += 1
+        worker = wk.Worker(self.search_generation, self.run_search, query)
+        worker.signals.finished.connect(self.on_search_finished)
+        worker.signals.failed.connect(self.on_processing_failed)
+        self.thread_pool.start(worker)
+
+    def run_search(self, query):
+        """ Runs on a worker thread, returns the query and a {deposition name: hits} dict """
+        import transcript_index as ti  # The index database is only opened once the user searches
+
+        with tracing.stage("gui.search") as span:
+            hits = ti.search(query)
+            span.set(hits=len(hits))
+        return query, ti.hits_by_document(hits)
+
+    def on_search_finished(self, generation, result):
+        if generation != self.search_generation:
+            return
+        import transcript_index as ti
+
+        query, documents = result
+        hit_count = sum(len(hits) for hits in documents.values())
+        self.search_status_label.setText(f'"{query}": {hit_count} lines in {len(documents)} depositions')
+        first_index = None
+        for name, hits in list(documents.items())[:MAX_SEARCH_TABS]:
+            # Each deposition's hits are formatted like highlights imported from its PDF
+            session = ss.TranscriptSession(name=f'"{query}" in {name}')
+            session.searchable = False
+            session.input_text = ti.hits_text(hits)
+            index = self.add_session(session)
+            if first_index is None:
+                first_index = index
+            session.processing_generation += 1
+            self.start_processing(session)
+        if first_index is not None:
+            self.tab_bar.setCurrentIndex(first_index)
+
+    def cancel_import(self):
+        self.session.cancel_import()
+
+    def update_import_widgets(self):
+        """ Shows the progress of the current tab's import, or hides the import controls when it has none """
+        importing = self.session.importing
+        self.import_progress_bar.setVisible(importing)
+        self.cancel_import_button.setVisible(importing)
+        self.text_box_left.setReadOnly(importing)
+        if importing:
+            pages_done, pages_total = self.session.import_progress
+            # A zero maximum shows a busy bar while the highlighted pages are still being counted
+            self.import_progress_bar.setRange(0, pages_total)
+            self.import_progress_bar.setValue(pages_done)
+
+    def on_import_finished(self, session, generation, highlighted_text):
+        if generation != session.import_generation or session not in self.sessions:
+            return
+        session.end_import()
+        session.imported_text = highlighted_text
+        session.input_text = highlighted_text
+        if session is self.session:
+            self.update_import_widgets()
+            if self.text_box_left.toPlainText() == highlighted_text:
+                # Every page already streamed in, only the processing run is left
+                self.on_text_change()
+            else:
+                with tracing.stage("gui.import_set_text", characters=len(highlighted_text)):
+                    self.text_box_left.setPlainText(highlighted_text)
+        else:
+            # Processed in the background, the results are ready when its tab is selected
+            session.processing_generation += 1
+            self.start_processing(session)
 
     @pyqtSlot()
     def hide_objections_change(self):
@@ -282,11 +552,47 @@ class TextProcessorApp(QWidget):
 
     def on_text_change(self):
         """ Trigger text reprocessing when the left text field changes either by paste or import """
-        the_text = self.aggregate_processed_pdf_text(gb.pdf_path)
-        output_powerpoint = fp.prepare_text_for_powerpoint(the_text)
-        output_oncue = fo.prepare_text_for_oncue(the_text)
-        self.text_box_top_right.setPlainText(output_powerpoint)
-        self.text_box_bottom_right.setPlainText(output_oncue)
+        # Any result still in flight is now stale, restarting the timer coalesces rapid edits
+        self.session.processing_generation += 1
+        self.processing_timer.start()
+
+    def start_processing(self, session=None):
+        """ Snapshot the input on the GUI thread and hand the formatting off to a worker thread """
+        current = session is None
+        if current:
+            session = self.session
+        if session.importing:
+            # A run now would extract the PDF a second time, out of reach of Cancel Import. The import starts a run
+            # of its own once it finishes
+            return
+        if current:
+            session.input_text = self.text_box_left.toPlainText()
+        the_text = None if session.pdf_path else session.input_text
+        worker = wk.Worker(session.processing_generation, session.process, session.pdf_path, the_text)
+        worker.signals.finished.connect(partial(self.on_processing_finished, session))
+        worker.signals.failed.connect(self.on_processing_failed)
+        self.thread_pool.start(worker)
+
+    def on_processing_finished(self, session, generation, result):
+        if generation != session.processing_generation:
+            return
+        session.output_powerpoint, session.output_oncue = result
+        if session is self.session:
+            with tracing.stage("gui.set_output_text",
+                               characters=len(session.output_powerpoint) + len(session.output_oncue)):
+                self.top_right_writer.set_text(session.output_powerpoint)
+                self.bottom_right_writer.set_text(session.output_oncue)
+        self.update_status()
+        if session.searchable and not session.pdf_path:
+            # Text of its own is indexed like an imported PDF, off the processing run so the outputs are not held up
+            self.thread_pool.start(wk.Worker(generation, session.index_text, generation, session.input_text))
+
+    def update_status(self):
+        """ Show the latest pipeline stage timings in the status area """
+        self.status_label.setText(tracing.summary_text(STATUS_STAGES))
+
+    def on_processing_failed(self, generation, message):
+        QMessageBox.warning(self, "Processing failed", message)
 
     def on_name_change(self):
         # Trigger text reprocessing when the name field changes
@@ -294,18 +600,41 @@ class TextProcessorApp(QWidget):
 
     @pyqtSlot()
     def activate_clear_button(self):
+        self.session.clear()
+        self.tab_bar.setTabText(self.sessions.index(self.session), self.session.name)
+        self.update_import_widgets()
         self.text_box_left.clear()
-        self.text_box_top_right.clear()
-        self.text_box_bottom_right.clear()
+        self.top_right_writer.clear()
+        self.bottom_right_writer.clear()
 
     def copy_top_right_to_clipboard(self):
         clipboard = QApplication.clipboard()
+        self.top_right_writer.flush()
         selected_text = self.text_box_top_right.toPlainText()
         # self.flash_color(self.text_box_top_right)
         clipboard.setText(selected_text)
 
+    def save_powerpoint_deck(self):
+        """ Writes one slide per highlighted segment of the current tab on a worker thread """
+        session = self.session
+        session.input_text = self.text_box_left.toPlainText()
+        default_name = os.path.splitext(session.name)[0] + ".pptx"
+        deck_path, _ = QFileDialog.getSaveFileName(self, "Save PowerPoint Deck", default_name,
+                                                   "PowerPoint files (*.pptx)")
+        if not deck_path:
+            return
+        import pptx_export as px  # Its XML helpers pull in urllib and http.client, too slow to load at startup
+
+        worker = wk.Worker(0, px.write_deck, deck_path, session.input_text.split('\n'), self.name_edit.text(),
+                           session.conditions)
+        worker.signals.finished.connect(
+            lambda generation, slides: self.status_label.setText(f"Saved {slides} slides to {deck_path}"))
+        worker.signals.failed.connect(self.on_processing_failed)
+        self.thread_pool.start(worker)
+
     def copy_bottom_right_to_clipboard(self):
         clipboard = QApplication.clipboard()
+        self.bottom_right_writer.flush()
         selected_text = self.text_box_bottom_right.toPlainText()
         # self.flash_color(self.text_box_bottom_right)
         clipboard.setText(selected_text)
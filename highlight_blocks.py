@@ -0,0 +1,57 @@
+import re
+
+""" Extracted Highlight Blocks """
+
+PAGE_HEADER_RE = re.compile(r'--- Page (\d+)')
+NUMBERED_LINE_RE = re.compile(r'(\d+) (.*?)(?: ---)?$')
+
+
+def format_highlight_blocks(blocks: list) -> tuple:
+    """ Joins (line_range_info, highlighted_text) blocks into the text shown in the left pane and the citations """
+    highlighted_texts = []
+    citations = []
+    for line_range_info, pdf_highlighted_text in blocks:
+        highlighted_texts.append(f"\n--- Page {line_range_info}: \n{pdf_highlighted_text} "
+                                 f"---\n")
+        citations.append(line_range_info)
+    return "".join(highlighted_texts), citations
+
+
+def build_line_table(blocks: list) -> dict:
+    """
+    Builds the per-page line table of the extracted highlights.
+
+    Args:
+        blocks (list): (line_range_info, highlighted_text) tuples as returned by pdf_intake.extract_highlight_blocks.
+
+    Returns:
+        dict: Page number -> list of [line_number, text] pairs, in the order they were highlighted.
+    """
+    line_table = {}
+    for line_range_info, highlighted_text in blocks:
+        page = int(line_range_info.split(':')[0])
+        for line in highlighted_text.split('\n'):
+            match = re.match(r'(\d+) (.*)', line)
+            if match:
+                line_table.setdefault(page, []).append([int(match.group(1)), match.group(2)])
+    return line_table
+
+
+def text_line_table(text: str) -> dict:
+    """
+    Builds the same per-page line table from text laid out like format_highlight_blocks output, such as pasted text or
+    a TXT transcript. Every numbered line is filed under the "--- Page" header above it, lines before the first
+    header have no page to cite and are left out.
+    """
+    line_table = {}
+    page = None
+    for line in text.split('\n'):
+        line = line.strip()
+        match = PAGE_HEADER_RE.match(line)
+        if match:
+            page = int(match.group(1))
+            continue
+        match = NUMBERED_LINE_RE.match(line)
+        if match and page is not None:
+            line_table.setdefault(page, []).append([int(match.group(1)), match.group(2)])
+    return line_table
@@ -0,0 +1,126 @@
+import format_powerpoint as fp
+import processing_functions as pf
+import tracing
+import transcript_ir as tir
+from globals import conditions_dict as cd
+
+""" Incremental Reformatting """
+
+PHRASE_QA = 'qa'
+PHRASE_CAPITALIZED = 'capitalized'
+
+
+def phrase_kind(kind):
+    """ The kind of phrase a line of the given processing_functions.LINE_* kind starts, None if it starts none """
+    if kind == pf.LINE_QA:
+        return PHRASE_QA
+    if kind == pf.LINE_OBJECTION or kind == pf.LINE_NON_PARTY:
+        return PHRASE_CAPITALIZED
+    return None
+
+
+class IncrementalFormatter:
+    """
+    Reformats text for PowerPoint while only re-running phrase assembly on the blocks that changed.
+
+    The parsed transcript is split into blocks that each begin with a Q./A., objection or non-party line. Such a line
+    resets the phrase being assembled, so a block's output only depends on its own lines. The one piece of state that
+    crosses a block boundary, whether the previous block's trailing phrase is kept, is resolved while splicing. This
+    makes the blocks finer than the "--- Page N:" sections emitted by pdf_intake while still producing exactly the
+    same output as format_powerpoint.process_transcript.
+    """
+
+    def __init__(self, conditions=None):
+        # The rule set this formatter applies, the globals default when None
+        self.conditions = cd if conditions is None else conditions
+        self.parser = tir.TranscriptParser(self.conditions)
+        self._rules = None
+        self._blocks = {}  # tuple of TranscriptLines -> process_transcript_block result
+        self._dirty_blocks = 0
+
+    def _check_rules(self):
+        rules = pf.conditions_key(self.conditions)
+        if rules != self._rules:
+            self._rules = rules
+            self._blocks = {}
+
+    def split_blocks(self, transcript):
+        """ Splits TranscriptLines into (leading kind, lines) blocks at every line that starts a new phrase """
+        self._check_rules()
+        blocks = []
+        current = []
+        current_kind = None
+        for transcript_line in transcript:
+            kind = phrase_kind(transcript_line.kind)
+            if kind is not None and current:
+                blocks.append((current_kind, tuple(current)))
+                current = []
+            if not current:
+                current_kind = kind
+            current.append(transcript_line)
+        if current:
+            blocks.append((current_kind, tuple(current)))
+        return blocks
+
+    def process_transcript(self, transcript):
+        """
+        Same contract as format_powerpoint.process_transcript, re-using the memoized result of every unchanged block.
+        """
+        with tracing.stage("powerpoint.split_blocks", lines=len(transcript)):
+            blocks = self.split_blocks(transcript)
+        with tracing.stage("powerpoint.process_blocks", blocks=len(blocks)) as span:
+            result = self._process_blocks(blocks)
+            span.set(dirty_blocks=self._dirty_blocks)
+        return result
+
+    def process_lines(self, lines):
+        """
+        Same contract as format_powerpoint.process_lines.
+        """
+        return self.process_transcript(list(self.parser.iter_lines(lines, remember=True)))
+
+    def _process_blocks(self, blocks):
+        """ Splices the memoized or freshly processed blocks, counting the ones that had to be re-run """
+        memo = {}
+        self._dirty_blocks = 0
+        completed_line_groups = []
+        first_num, last_num = None, None
+        trailing_phrase, trailing_capitalize = "", False
+
+        for leading_kind, block in blocks:
+            result = memo.get(block) or self._blocks.get(block)
+            if result is None:
+                result = fp.process_transcript_block(block)
+                self._dirty_blocks += 1
+            memo[block] = result
+            block_groups, phrase_being_assembled, capitalize, block_first, block_last = result
+
+            # A Q./A. line only keeps the previous phrase when it was not an objection or non-party remark
+            if trailing_phrase and leading_kind == PHRASE_QA and not trailing_capitalize:
+                completed_line_groups.append(trailing_phrase)
+            completed_line_groups.extend(block_groups)
+            trailing_phrase, trailing_capitalize = phrase_being_assembled, capitalize
+
+            if first_num is None:
+                first_num = block_first
+            if block_last is not None:
+                last_num = block_last
+
+        if trailing_phrase:
+            completed_line_groups.append(trailing_phrase.upper() if trailing_capitalize else trailing_phrase)
+
+        self._blocks = memo
+        return completed_line_groups, first_num, last_num
+
+    def render(self, transcript, witness_name_text="Jimmy"):
+        """
+        Incremental equivalent of format_powerpoint.render_powerpoint.
+        """
+        completed_line_groups, first_num, last_num = self.process_transcript(transcript)
+        return fp.finalize_and_format(completed_line_groups, first_num, last_num, witness_name_text)
+
+    def prepare_text_for_powerpoint(self, text):
+        """
+        Incremental equivalent of format_powerpoint.prepare_text_for_powerpoint.
+        """
+        return self.render(self.parser.parse(text))
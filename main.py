@@ -1,4 +1,18 @@
-from gui import *
+import os
+import sys
+import time
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+from gui import TextProcessorApp
+
+STARTUP_PROBE_ENV = "TRANSCRIPT_STARTUP_PROBE"  # Print the time to first paint and quit, used by benchmark.py
+
+
+def report_first_paint():
+    # The probe variable holds the wall-clock time the benchmark launched this process
+    print(f"first_paint {time.time() - float(os.environ[STARTUP_PROBE_ENV]):.6f}", flush=True)
+    QApplication.quit()
+
 
 def main():
     app = QApplication(sys.argv)
@@ -6,8 +20,11 @@ def main():
     # qdarktheme.setup_theme("light")
     ex = TextProcessorApp()
     ex.show()
+    if os.environ.get(STARTUP_PROBE_ENV):
+        # A zero timeout fires once the event loop has handled the show and first paint events
+        QTimer.singleShot(0, report_first_paint)
     sys.exit(app.exec())
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
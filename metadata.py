@@ -1,6 +1,5 @@
 build_number = 7710
-known_issues_lst = ("- Segments that span multiple pages are not yet supported for designation lists",
-                    "- Items imported from PDF appear in the left window in the order they were highlighted, "
+known_issues_lst = ("- Items imported from PDF appear in the left window in the order they were highlighted, "
                     "not sequentially",
                     "- The auto-generated cite does not yet account for multiple segments",
                     "- When copying from pdf or text file, make sure to include selection of the first line number to"
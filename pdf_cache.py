@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import highlight_blocks as hb
+
+""" Cache of Extracted PDF Highlights """
+
+MAX_CACHED_PDFS = 8
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_cache = OrderedDict()  # (path, size, mtime, digest) -> (highlighted_text, citations)
+_digests = {}  # (path, size, mtime) -> digest
+_lock = threading.Lock()
+
+
+def file_digest(pdf_path):
+    """ Hash the file contents so a touched but unchanged PDF keeps its cache entry """
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(pdf_path):
+    """
+    Builds the cache key for a PDF: path, size, mtime and content hash.
+    The hash is only computed when the path/size/mtime signature has not been seen before,
+    so repeated lookups cost a single stat call.
+    """
+    pdf_path = os.path.abspath(pdf_path)
+    try:
+        stat = os.stat(pdf_path)
+    except OSError as err:
+        raise ValueError(f"Failed to open PDF file: {err}")
+    signature = (pdf_path, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        digest = _digests.get(signature)
+    if digest is None:
+        digest = file_digest(pdf_path)
+        with _lock:
+            # Only the newest signature per path is worth remembering
+            for stale in [stale for stale in _digests if stale[0] == pdf_path]:
+                del _digests[stale]
+            _digests[signature] = digest
+    return signature + (digest,)
+
+
+def get_highlighted_text(pdf_path, progress=None, cancel=None):
+    """
+    Returns the (highlighted_text, citations) tuple for a PDF.
+    Looks in memory first, then in the on-disk transcript store, and only extracts with pdf_intake when both miss.
+    progress and cancel are handed to pdf_intake.extract_highlight_blocks, so they only come into play on a miss.
+    """
+    key = cache_key(pdf_path)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    import transcript_index as ti
+    import transcript_store as ts
+
+    digest = key[3]
+    payload = ts.load(digest)
+    if payload is None:
+        # PyMuPDF takes longer to import than the rest of the app, so it is only loaded once a PDF has to be read
+        import pdf_intake as pd
+        blocks = pd.extract_highlight_blocks(pdf_path, progress=progress, cancel=cancel)
+        payload = {'blocks': blocks, 'citations': [line_range_info for line_range_info, _ in blocks],
+                   'line_table': hb.build_line_table(blocks)}
+        ts.save(digest, payload)
+        ti.add_transcript(digest, os.path.basename(pdf_path), payload['line_table'])
+    elif not ti.is_indexed(digest):
+        # Parsed before the index existed, or the index was cleared
+        ti.add_transcript(digest, os.path.basename(pdf_path), payload['line_table'])
+    result = hb.format_highlight_blocks(payload['blocks'])
+
+    with _lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_PDFS:
+            _cache.popitem(last=False)
+    return result
+
+
+def invalidate(pdf_path=None):
+    """ Drop the cached extraction for one PDF, or for every PDF when no path is given """
+    with _lock:
+        if pdf_path is None:
+            _cache.clear()
+            _digests.clear()
+            return
+        pdf_path = os.path.abspath(pdf_path)
+        for key in [key for key in _cache if key[0] == pdf_path]:
+            del _cache[key]
+        for signature in [signature for signature in _digests if signature[0] == pdf_path]:
+            del _digests[signature]
@@ -1,54 +1,265 @@
+import os
 import re
 import sys
-import globals as gb
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
+import tracing
+import word_index as wi
+# Re-exported, kept in modules of their own so callers can use them without importing PyMuPDF
+from cancellation import CancelToken, ExtractionCancelled
+from highlight_blocks import build_line_table, format_highlight_blocks
 
+CHUNKS_PER_WORKER = 4
 
-def extract_highlighted_text_with_coordinates(pdf_path: str) -> tuple:
-    """
-    Extracts highlighted text from a PDF file and returns it along with the page numbers where it was found.
+# PyMuPDF does not support being used from several threads at once, even on separate documents. Every fitz call made
+# in this process goes through the lock, one page at a time, so imports running side by side on GUI worker threads
+# take turns page by page. Worker processes have their own.
+_fitz_lock = threading.RLock()
 
-    Args:
-        pdf_path (str): The path to the PDF file.
 
-    Returns:
-        tuple: A tuple containing the highlighted text and a list of the page numbers where it was found.
+def _reset_fitz_lock():
+    # A fork can happen while another thread holds the lock, the child starts with a free one
+    global _fitz_lock
+    _fitz_lock = threading.RLock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_fitz_lock)
+
+
+def open_pdf(pdf_path: str):
+    """
+    Opens a PDF file with fitz.
 
     Raises:
         ValueError: If the PDF file cannot be opened or read.
     """
-    # Open the PDF file
     try:
-        doc = fitz.open(gb.pdf_path)
+        with _fitz_lock:
+            return fitz.open(pdf_path)
     except OSError as err:
         raise ValueError(f"Failed to open PDF file: {err}")
 
-    # Extract the highlighted text and page numbers
-    highlighted_texts = []
-    citations = []
+
+def highlighted_page_numbers(doc) -> list:
+    """
+    Builds an index of the pages that carry highlight annotations.
+
+    Reads each page's /Annots array and the /Subtype of every annotation straight from the PDF objects, so pages are
+    never loaded or laid out just to find out they have no highlights.
+
+    Args:
+        doc (fitz.Document): The open PDF document.
+
+    Returns:
+        list: The (0-based) page numbers with at least one highlight, in page order.
+    """
+    page_numbers = []
     for page_num in range(len(doc)):
+        kind, annots = doc.xref_get_key(doc.page_xref(page_num), "Annots")
+        if kind == "null":
+            continue
+        if kind == "xref":  # The array itself is an indirect object
+            annots = doc.xref_object(int(annots.split()[0]), compressed=True)
+        for annot_xref in re.findall(r'(\d+) \d+ R', annots):
+            if doc.xref_get_key(int(annot_xref), "Subtype") == ("name", "/Highlight"):
+                page_numbers.append(page_num)
+                break
+    return page_numbers
+
+
+def annotation_rects(annot) -> list:
+    """
+    Returns the rectangles covered by a highlight, one per quad, falling back to the bounding rect.
+
+    A multi-line highlight has one quad per line, so using the quads instead of annot.rect keeps text from the
+    start of the first line and the end of the last line out of the extracted span.
+    """
+    vertices = annot.vertices
+    if not vertices or len(vertices) < 4:
+        return [tuple(annot.rect)]
+    return [tuple(fitz.Quad(vertices[i:i + 4]).rect) for i in range(0, len(vertices) - 3, 4)]
+
+
+def page_highlights(doc, page_num: int) -> list:
+    """ The (line_range_info, highlighted_text) blocks of one page, callers hold the fitz lock """
+    blocks = []
+    with tracing.stage("pdf.load_page", page=page_num + 1):
         page = doc.load_page(page_num)
         annotations = page.annots()
-        if annotations is not None:
-            annotations_found = True
-            for annot in annotations:
-                if annot.type[0] == 8:  # Check if the annotation is a highlight
-                    rect = annot.rect
-                    highlighted_text = page.get_text("text", clip=rect)
-                    # Process the highlighted text and get line range info
-                    line_range_info: str
-                    highlighted_text: str
-                    result = process_pdf_highlighted_text(highlighted_text, page_num)
-                    line_range_info = result[0]
-                    pdf_highlighted_text = result[1]
-                    highlighted_texts.append(f"\n--- Page {line_range_info}: \n{pdf_highlighted_text} "
-                                             f"---\n")
-                    citations.append(line_range_info)
+    if annotations is not None:
+        word_index = None
+        for annot in annotations:
+            if annot.type[0] == 8:  # Check if the annotation is a highlight
+                if word_index is None:
+                    # One text extraction per page, every highlight is resolved against the index
+                    with tracing.stage("pdf.page_words") as span:
+                        word_index = wi.PageWordIndex(page.get_text("words"))
+                        span.set(words=len(word_index.words))
+                with tracing.stage("pdf.resolve_highlight"):
+                    if word_index.line_numbers:
+                        # Line numbers are paired with their rows by position, then tagged with the line range
+                        rows = word_index.numbered_rows(annotation_rects(annot))
+                        blocks.append(process_numbered_rows(rows, page_num))
+                    else:
+                        # No line numbers to pair rows with, e.g. an unnumbered exhibit page: the text is read in
+                        # its layout order
+                        text = page.get_text("text", clip=annot.rect)
+                        blocks.append(process_pdf_highlighted_text(text, page_num))
+    return blocks
+
+
+def iter_page_highlights(doc, page_numbers: list):
+    """
+    Extracts the highlighted blocks of the given pages one page at a time.
+
+    Args:
+        doc (fitz.Document): The open PDF document.
+        page_numbers (list): The (0-based) page numbers to scan, in page order.
+
+    Yields:
+        tuple: (page_num, blocks) for every page, blocks being its (line_range_info, highlighted_text) tuples.
+    """
+    for page_num in page_numbers:
+        with _fitz_lock:
+            blocks = page_highlights(doc, page_num)
+        yield page_num, blocks
+
+
+def extract_page_highlights(pdf_path: str, page_numbers: list) -> list:
+    """
+    Extracts the highlighted blocks found on the given pages of a PDF file.
+
+    The document is opened here rather than passed in, so the function can run in a worker process.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        page_numbers (list): The (0-based) page numbers to scan, in page order.
+
+    Returns:
+        list: (line_range_info, highlighted_text) tuples in page order.
+    """
+    doc = open_pdf(pdf_path)
+    blocks = []
+    for _, page_blocks in iter_page_highlights(doc, page_numbers):
+        blocks.extend(page_blocks)
 
     # Close the PDF file
-    doc.close()
+    with _fitz_lock:
+        doc.close()
+    return blocks
+
+
+def page_chunks(page_numbers: list, workers: int) -> list:
+    """ Splits the pages into a few chunks per worker so uneven pages still balance out """
+    chunk_count = max(1, min(len(page_numbers), workers * CHUNKS_PER_WORKER))
+    chunk_size = -(-len(page_numbers) // chunk_count)
+    return [page_numbers[start:start + chunk_size] for start in range(0, len(page_numbers), chunk_size)]
+
+
+def extract_highlight_blocks(pdf_path: str, workers: int = 1, progress=None, cancel: CancelToken = None) -> list:
+    """
+    Extracts the highlighted blocks of a PDF file, optionally spreading the pages across worker processes.
+
+    Only pages listed by highlighted_page_numbers are loaded.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        workers (int): The number of worker processes. 1 scans the pages in this process.
+        progress (callable): Called as progress(pages_done, pages_total, new_blocks) after every page, or after
+            every chunk of pages when workers > 1, with the blocks that page or chunk added, in page order.
+        cancel (CancelToken): Checked between pages (between chunks when workers > 1).
+
+    Returns:
+        list: (line_range_info, highlighted_text) tuples in page order.
+
+    Raises:
+        ValueError: If the PDF file cannot be opened or read.
+        ExtractionCancelled: If the cancel token was cancelled before the extraction finished.
+    """
+    with tracing.stage("pdf.index") as span:
+        doc = open_pdf(pdf_path)
+        with _fitz_lock:
+            page_numbers = highlighted_page_numbers(doc)
+            span.set(pages=len(doc), highlighted_pages=len(page_numbers))
+            doc.close()
+
+    total = len(page_numbers)
+    with tracing.stage("pdf.extract", pages=total, workers=workers) as span:
+        blocks = []
+        if workers <= 1 or total < 2:
+            doc = open_pdf(pdf_path)
+            try:
+                for done, (_, page_blocks) in enumerate(iter_page_highlights(doc, page_numbers), 1):
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    blocks.extend(page_blocks)
+                    if progress is not None:
+                        progress(done, total, page_blocks)
+            finally:
+                with _fitz_lock:
+                    doc.close()
+        else:
+            chunks = page_chunks(page_numbers, workers)
+            done = 0
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                # map keeps the chunk order, so the merged blocks stay in page order
+                for chunk, chunk_blocks in zip(chunks, executor.map(extract_page_highlights, [pdf_path] * len(chunks),
+                                                                    chunks)):
+                    if cancel is not None and cancel.cancelled:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        cancel.raise_if_cancelled()
+                    blocks.extend(chunk_blocks)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, total, chunk_blocks)
+        span.set(annotations=len(blocks))
+    return blocks
+
 
-    return "".join(highlighted_texts), citations
+def extract_highlighted_text_with_coordinates(pdf_path: str, workers: int = 1, progress=None,
+                                              cancel: CancelToken = None) -> tuple:
+    """
+    Extracts highlighted text from a PDF file and returns it along with the page numbers where it was found.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        workers (int): The number of worker processes to spread the pages across. Defaults to 1 (serial).
+        progress (callable): Called as progress(pages_done, pages_total, new_blocks) as pages finish, new_blocks
+            being (line_range_info, highlighted_text) tuples; format_highlight_blocks renders them as partial text.
+        cancel (CancelToken): Stops the extraction between pages once cancelled.
+
+    Returns:
+        tuple: A tuple containing the highlighted text and a list of the page numbers where it was found.
+
+    Raises:
+        ValueError: If the PDF file cannot be opened or read.
+        ExtractionCancelled: If the cancel token was cancelled before the extraction finished.
+    """
+    return format_highlight_blocks(extract_highlight_blocks(pdf_path, workers, progress, cancel))
+
+
+def process_numbered_rows(rows: list, page_num: int) -> tuple:
+    """
+    Tags highlighted rows with their page and line range.
+
+    Args:
+        rows (list): (line_number, text) pairs as returned by word_index.PageWordIndex.numbered_rows.
+        page_num (int): The (0-based) page number the rows were found on.
+
+    Returns:
+        tuple: The line range info ("page:first-last", or just the page when no row is numbered) and the rows as
+            "line_number text" lines, in the form process_pdf_highlighted_text produces.
+    """
+    line_numbers = [line_number for line_number, _ in rows if line_number is not None]
+    if line_numbers and line_numbers[0] and line_numbers[-1]:
+        line_range_info = f"{page_num + 1}:{line_numbers[0]}-{line_numbers[-1]}"
+    else:
+        line_range_info = f"{page_num + 1}"
+    processed_text = "".join(f"{text}\n" if line_number is None else f"{line_number} {text}\n"
+                             for line_number, text in rows)
+    return line_range_info, processed_text
 
 
 def process_pdf_highlighted_text(text: str, page_num: int) -> tuple:
@@ -69,7 +280,7 @@ def process_pdf_highlighted_text(text: str, page_num: int) -> tuple:
 
     for i, line in enumerate(lines):
         # Match a line number at the beginning of a line
-        match = re.match(r'^(\d+)\s*$', line)
+        match = re.match(r'^\s*(\d+)\s*$', line)
         if match:
             line_number = int(match.group(1))
 
@@ -82,7 +293,7 @@ def process_pdf_highlighted_text(text: str, page_num: int) -> tuple:
             if i + 1 < len(lines):
                 combined_line = f"{line_number} {lines[i + 1]}"
                 processed_text.append(combined_line)
-        elif i == 0 or not re.match(r'^\d+\s*$', lines[i - 1]):
+        elif i == 0 or not re.match(r'^\s*\d+\s*$', lines[i - 1]):
             # Include lines that are not immediately after a line number
             processed_text.append(line)
 
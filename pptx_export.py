@@ -0,0 +1,246 @@
+import re
+import zipfile
+from xml.sax.saxutils import escape
+import format_powerpoint as fp
+import processing_functions as pf
+import tracing
+import transcript_ir as tir
+
+""" PowerPoint Deck Export """
+
+SLIDE_WIDTH = 12192000  # EMU, 16:9
+SLIDE_HEIGHT = 6858000
+MARGIN = 457200
+CITE_HEIGHT = 685800
+BODY_FONT_SIZE = 2400  # Hundredths of a point
+CITE_FONT_SIZE = 1800
+SEGMENT_END = "---"  # Closes every highlight block pdf_intake writes
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+CONTENT_TYPE = "application/vnd.openxmlformats-officedocument."
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+NAMESPACES = f'xmlns:a="{NS_A}" xmlns:r="{NS_R}" xmlns:p="{NS_P}"'
+
+EMPTY_SHAPE_TREE = (
+    '<p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+    '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/><a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/>'
+    '</a:xfrm></p:grpSpPr>'
+)
+
+SLIDE_MASTER = (
+    f'{XML_DECLARATION}<p:sldMaster {NAMESPACES}>'
+    f'<p:cSld><p:bg><p:bgRef idx="1001"><a:schemeClr val="bg1"/></p:bgRef></p:bg>'
+    f'<p:spTree>{EMPTY_SHAPE_TREE}</p:spTree></p:cSld>'
+    '<p:clrMap bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" accent2="accent2" accent3="accent3" '
+    'accent4="accent4" accent5="accent5" accent6="accent6" hlink="hlink" folHlink="folHlink"/>'
+    '<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst>'
+    '<p:txStyles><p:titleStyle/><p:bodyStyle/><p:otherStyle/></p:txStyles>'
+    '</p:sldMaster>'
+)
+
+SLIDE_LAYOUT = (
+    f'{XML_DECLARATION}<p:sldLayout {NAMESPACES} type="blank" preserve="1">'
+    f'<p:cSld name="Blank"><p:spTree>{EMPTY_SHAPE_TREE}</p:spTree></p:cSld>'
+    '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sldLayout>'
+)
+
+
+THEME = (
+    f'{XML_DECLARATION}<a:theme xmlns:a="{NS_A}" name="Transcript"><a:themeElements>'
+    '<a:clrScheme name="Transcript">'
+    '<a:dk1><a:sysClr val="windowText" lastClr="000000"/></a:dk1>'
+    '<a:lt1><a:sysClr val="window" lastClr="FFFFFF"/></a:lt1>'
+    '<a:dk2><a:srgbClr val="1F2A44"/></a:dk2><a:lt2><a:srgbClr val="E7E6E6"/></a:lt2>'
+    '<a:accent1><a:srgbClr val="4472C4"/></a:accent1><a:accent2><a:srgbClr val="ED7D31"/></a:accent2>'
+    '<a:accent3><a:srgbClr val="A5A5A5"/></a:accent3><a:accent4><a:srgbClr val="FFC000"/></a:accent4>'
+    '<a:accent5><a:srgbClr val="5B9BD5"/></a:accent5><a:accent6><a:srgbClr val="70AD47"/></a:accent6>'
+    '<a:hlink><a:srgbClr val="0563C1"/></a:hlink><a:folHlink><a:srgbClr val="954F72"/></a:folHlink>'
+    '</a:clrScheme>'
+    '<a:fontScheme name="Transcript">'
+    '<a:majorFont><a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/></a:majorFont>'
+    '<a:minorFont><a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/></a:minorFont>'
+    '</a:fontScheme>'
+    '<a:fmtScheme name="Transcript">'
+    '<a:fillStyleLst>' + '<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>' * 3 + '</a:fillStyleLst>'
+    '<a:lnStyleLst>' + ''.join(f'<a:ln w="{width}"><a:solidFill><a:schemeClr val="phClr"/></a:solidFill></a:ln>'
+                               for width in (6350, 12700, 19050)) + '</a:lnStyleLst>'
+    '<a:effectStyleLst>' + '<a:effectStyle><a:effectLst/></a:effectStyle>' * 3 + '</a:effectStyleLst>'
+    '<a:bgFillStyleLst>' + '<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>' * 3 + '</a:bgFillStyleLst>'
+    '</a:fmtScheme></a:themeElements></a:theme>'
+)
+
+
+def relationships(targets):
+    """ A .rels part for (relationship type, target) pairs, numbered rId1, rId2, ... """
+    return (f'{XML_DECLARATION}<Relationships xmlns="{NS_REL}">'
+            + "".join(f'<Relationship Id="rId{number}" Type="{REL_TYPE}{kind}" Target="{target}"/>'
+                      for number, (kind, target) in enumerate(targets, 1))
+            + '</Relationships>')
+
+
+def paragraphs(text, font_size, italic=False):
+    """ One <a:p> per line of text """
+    style = f'lang="en-US" sz="{font_size}"' + (' i="1"' if italic else '') + ' dirty="0"'
+    parts = []
+    for line in text.split('\n'):
+        line = _INVALID_XML_CHARS.sub('', line)
+        if line:
+            parts.append(f'<a:p><a:r><a:rPr {style}/><a:t>{escape(line)}</a:t></a:r></a:p>')
+        else:
+            parts.append(f'<a:p><a:endParaRPr {style}/></a:p>')
+    return "".join(parts)
+
+
+def text_box(shape_id, name, x, y, width, height, body, alignment=None):
+    paragraph_alignment = f'<a:lvl1pPr algn="{alignment}"/>' if alignment else ''
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="{name}"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+            f'<p:spPr><a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{width}" cy="{height}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom><a:noFill/></p:spPr>'
+            '<p:txBody><a:bodyPr wrap="square" rtlCol="0"><a:normAutofit/></a:bodyPr>'
+            f'<a:lstStyle>{paragraph_alignment}</a:lstStyle>{body}</p:txBody></p:sp>')
+
+
+def slide_xml(body, cite):
+    body_height = SLIDE_HEIGHT - 2 * MARGIN - CITE_HEIGHT
+    return (f'{XML_DECLARATION}<p:sld {NAMESPACES}><p:cSld><p:spTree>{EMPTY_SHAPE_TREE}'
+            + text_box(2, "Excerpt", MARGIN, MARGIN, SLIDE_WIDTH - 2 * MARGIN, body_height,
+                       paragraphs(body, BODY_FONT_SIZE))
+            + text_box(3, "Cite", MARGIN, MARGIN + body_height, SLIDE_WIDTH - 2 * MARGIN, CITE_HEIGHT,
+                       paragraphs(cite, CITE_FONT_SIZE, italic=True), alignment="r")
+            + '</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>')
+
+
+class PptxWriter:
+    """
+    Writes a .pptx deck one slide at a time.
+
+    Every slide is compressed into the zip as soon as it is added, only the slide count is kept, and the parts that
+    list the slides are written on close, so memory stays flat however many slides the deck has.
+
+        with PptxWriter(path) as writer:
+            writer.add_slide(body, cite)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.slide_count = 0
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def add_slide(self, body, cite):
+        self.slide_count += 1
+        self.zip.writestr(f"ppt/slides/slide{self.slide_count}.xml", slide_xml(body, cite))
+        self.zip.writestr(f"ppt/slides/_rels/slide{self.slide_count}.xml.rels",
+                          relationships([("slideLayout", "../slideLayouts/slideLayout1.xml")]))
+
+    def close(self):
+        if self.zip is None:
+            return
+        slides = range(1, self.slide_count + 1)
+        self.zip.writestr("ppt/presentation.xml", (
+            f'{XML_DECLARATION}<p:presentation {NAMESPACES} saveSubsetFonts="1">'
+            '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+            + ('<p:sldIdLst>' + "".join(f'<p:sldId id="{255 + number}" r:id="rId{2 + number}"/>' for number in slides)
+               + '</p:sldIdLst>' if self.slide_count else '')
+            + f'<p:sldSz cx="{SLIDE_WIDTH}" cy="{SLIDE_HEIGHT}"/><p:notesSz cx="6858000" cy="9144000"/>'
+            '</p:presentation>'))
+        self.zip.writestr("ppt/_rels/presentation.xml.rels", relationships(
+            [("slideMaster", "slideMasters/slideMaster1.xml"), ("theme", "theme/theme1.xml")]
+            + [("slide", f"slides/slide{number}.xml") for number in slides]))
+        self.zip.writestr("ppt/slideMasters/slideMaster1.xml", SLIDE_MASTER)
+        self.zip.writestr("ppt/slideMasters/_rels/slideMaster1.xml.rels", relationships(
+            [("slideLayout", "../slideLayouts/slideLayout1.xml"), ("theme", "../theme/theme1.xml")]))
+        self.zip.writestr("ppt/slideLayouts/slideLayout1.xml", SLIDE_LAYOUT)
+        self.zip.writestr("ppt/slideLayouts/_rels/slideLayout1.xml.rels", relationships(
+            [("slideMaster", "../slideMasters/slideMaster1.xml")]))
+        self.zip.writestr("ppt/theme/theme1.xml", THEME)
+        self.zip.writestr("_rels/.rels", relationships([("officeDocument", "ppt/presentation.xml")]))
+        self.zip.writestr("[Content_Types].xml", (
+            f'{XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/ppt/presentation.xml" '
+            f'ContentType="{CONTENT_TYPE}presentationml.presentation.main+xml"/>'
+            f'<Override PartName="/ppt/slideMasters/slideMaster1.xml" '
+            f'ContentType="{CONTENT_TYPE}presentationml.slideMaster+xml"/>'
+            f'<Override PartName="/ppt/slideLayouts/slideLayout1.xml" '
+            f'ContentType="{CONTENT_TYPE}presentationml.slideLayout+xml"/>'
+            f'<Override PartName="/ppt/theme/theme1.xml" ContentType="{CONTENT_TYPE}theme+xml"/>'
+            + "".join(f'<Override PartName="/ppt/slides/slide{number}.xml" '
+                      f'ContentType="{CONTENT_TYPE}presentationml.slide+xml"/>' for number in slides)
+            + '</Types>'))
+        self.zip.close()
+        self.zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def transcript_segments(transcript):
+    """
+    Splits TranscriptLines into highlighted segments at the "--- Page" headers pdf_intake writes above every
+    highlight. Yields (page, lines) with the closing "---" removed; text without headers is a single segment.
+    """
+    page = None
+    lines = []
+    for transcript_line in transcript:
+        if transcript_line.kind == pf.LINE_PAGE_HEADER:
+            if lines:
+                yield page, close_segment(lines)
+            page, lines = transcript_line.page, []
+            continue
+        lines.append(transcript_line)
+    if lines:
+        yield page, close_segment(lines)
+
+
+def close_segment(lines):
+    """ Drops the "---" closing a highlight block, on a line of its own or after the last line's text """
+    while lines and not lines[-1].text:
+        lines.pop()
+    if lines:
+        last = lines[-1]
+        if last.text == SEGMENT_END:
+            lines.pop()
+        elif last.text.endswith(" " + SEGMENT_END):
+            lines[-1] = tir.TranscriptLine(last.page, last.number, last.kind, last.text[:-len(SEGMENT_END)].rstrip(),
+                                           last.designations)
+    return lines
+
+
+def transcript_slides(transcript, witness_name_text="Jimmy"):
+    """
+    Yields a (body, cite) slide for every highlighted segment of any iterable of TranscriptLines: the segment's
+    PowerPoint formatting and the cite finalize_and_format would close it with, with the page filled in.
+    """
+    for page, lines in transcript_segments(transcript):
+        completed_line_groups, first_num, last_num = fp.process_transcript(lines)
+        body = pf.format_output(completed_line_groups, first_num, last_num)
+        if body:
+            yield body, fp.cite_line(first_num, last_num, witness_name_text, page)
+
+
+def write_deck(path, lines, witness_name_text="Jimmy", conditions=None):
+    """
+    Writes one slide per highlighted segment of the transcript lines (any iterable, such as an open file) to a .pptx
+    file. Lines are parsed and slides written as they stream in. Returns the number of slides.
+    """
+    return write_transcript_deck(path, tir.iter_transcript(lines, conditions), witness_name_text)
+
+
+def write_transcript_deck(path, transcript, witness_name_text="Jimmy"):
+    """ Same as write_deck for an already parsed transcript, any iterable of TranscriptLines """
+    with tracing.stage("pptx.write") as span, PptxWriter(path) as writer:
+        for body, cite in transcript_slides(transcript, witness_name_text):
+            writer.add_slide(body, cite)
+        span.set(slides=writer.slide_count)
+    return writer.slide_count
@@ -1,3 +1,7 @@
+import re
+
+LINE_NUMBER_RE = re.compile(r'(\d+)\s*')
+
 def split_text(text):
     return text.split('\n')
 
@@ -5,11 +9,58 @@ def check_for_space_dots_in_text(text):
     pass
 
 
+MAX_COMPILED_RULE_SETS = 8  # Several sessions can each hold their own rule set
+_compiled_swaps = {}
+
+
+def trie_pattern(words):
+    """
+    Regex source for a character trie of the words. Every branch starts with a different character and optional
+    tails are greedy, so a match is always the longest word at its position and the scan cost does not grow with
+    the number of words.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def node_pattern(node):
+        branches = [re.escape(char) + node_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return node_pattern(trie)
+
+
+def compile_swaps(swap_phrase_dict):
+    """
+    Builds a function that applies every swap in one left-to-right pass, cached per dictionary contents.
+    Where several phrases match at the same position the longest one wins, and replaced text is never rescanned.
+    """
+    key = tuple(swap_phrase_dict.items())
+    replace = _compiled_swaps.get(key)
+    if replace is None:
+        if swap_phrase_dict:
+            pattern = re.compile(trie_pattern(swap_phrase_dict))
+            replacement = swap_phrase_dict.__getitem__
+
+            def replace(line):
+                return pattern.sub(lambda match: replacement(match.group(0)), line)
+        else:
+            def replace(line):
+                return line
+        if len(_compiled_swaps) >= MAX_COMPILED_RULE_SETS:
+            _compiled_swaps.clear()
+        _compiled_swaps[key] = replace
+    return replace
+
+
 def replace_words(line, swap_phrase_dict):
-    for word, replacement in swap_phrase_dict.items():
-        if word in line:
-            line = line.replace(word, replacement)
-    return line
+    return compile_swaps(swap_phrase_dict)(line)
 
 
 ''' LINE FILTERING '''
@@ -65,6 +116,74 @@ def assemble_phrases(line, qa_phrases, objection_phrases, non_party_phrases, cap
     return phrase_being_assembled, completed_line_groups, capitalize
 
 
+""" Compiled Line Classification """
+
+LINE_QA = 'qa'
+LINE_OBJECTION = 'objection'
+LINE_NON_PARTY = 'non_party'
+LINE_BY = 'by'
+LINE_PAGE_HEADER = 'page_header'
+
+_compiled_conditions = {}
+
+
+def conditions_key(conditions):
+    """ Hashable snapshot of a conditions dict, changes whenever the rule set does """
+    return (tuple(conditions['qa_phrases']), tuple(conditions['objection_phrases']),
+            tuple(conditions['non_party_phrases']), tuple(conditions['swap_phrase_dict'].items()))
+
+
+def compile_conditions(conditions):
+    """
+    Compiles the phrase lists of a conditions dict into one anchored alternation, cached per rule set.
+    Alternatives are tried in the same order the line filters and phrase assembly check them:
+    BY-lines, page headers, Q./A., objections, then non-party phrases.
+    """
+    key = conditions_key(conditions)
+    pattern = _compiled_conditions.get(key)
+    if pattern is None:
+        def alternation(phrases):
+            # An empty list must never match
+            return "|".join(re.escape(phrase) for phrase in phrases) or "(?!)"
+
+        pattern = re.compile(
+            rf"(?P<{LINE_BY}>(?:QUESTIONS )?BY.*:)"
+            rf"|(?P<{LINE_PAGE_HEADER}>--- Page)"
+            rf"|(?P<{LINE_QA}>{alternation(conditions['qa_phrases'])})"
+            rf"|(?P<{LINE_OBJECTION}>{alternation(conditions['objection_phrases'])})"
+            rf"|(?P<{LINE_NON_PARTY}>{alternation(conditions['non_party_phrases'])})"
+        )
+        if len(_compiled_conditions) >= MAX_COMPILED_RULE_SETS:
+            _compiled_conditions.clear()
+        _compiled_conditions[key] = pattern
+    return pattern
+
+
+def classify_line(line, pattern):
+    """ Returns the LINE_* kind a line starts with, or None for a continuation line """
+    match = pattern.match(line)
+    return match.lastgroup if match else None
+
+
+def assemble_classified_phrase(line, kind, capitalize, phrase_being_assembled):
+    """
+    Same as assemble_phrases for a line that has already been classified with classify_line.
+    """
+    completed_line_groups = []
+    if kind == LINE_QA:
+        # Only a Q./A. line closes the previous phrase, and only when it was not capitalized
+        if phrase_being_assembled and not capitalize:
+            completed_line_groups.append(phrase_being_assembled)
+        return "\n" + line[:2] + "\t" + line[2:].lstrip(), completed_line_groups, False
+    if kind == LINE_OBJECTION or kind == LINE_NON_PARTY:
+        return "\n" + line, completed_line_groups, True
+    if line and not capitalize:
+        if phrase_being_assembled:
+            phrase_being_assembled += " "
+        phrase_being_assembled += line
+    return phrase_being_assembled, completed_line_groups, capitalize
+
+
 """ Final Output Formatting """
 
 
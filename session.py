@@ -0,0 +1,143 @@
+import copy
+import hashlib
+import itertools
+import os
+import threading
+import cancellation as cn
+import format_oncue as fo
+import highlight_blocks as hb
+import incremental as inc
+import pdf_cache as pc
+import tracing
+import transcript_ir as tir
+from globals import conditions_dict as cd
+
+""" Per-Document Sessions """
+
+_untitled_numbers = itertools.count(1)
+
+
+def untitled_name():
+    return f"Untitled {next(_untitled_numbers)}"
+
+
+class TranscriptSession:
+    """
+    One open deposition: where its text comes from, the text itself, its own copy of the rule set, the incremental
+    formatter memo and the outputs of its latest run.
+
+    Sessions share no mutable state, so several can be imported and processed on worker threads at once. The worker
+    methods only read the session and return their results, the GUI thread stores them. Runs of the same session are
+    serialized by its lock, since they share its formatter.
+    """
+
+    def __init__(self, conditions=None, name=None):
+        self.name = name or untitled_name()
+        self.pdf_path = None
+        self.imported_text = None
+        self.input_text = ""
+        self.conditions = copy.deepcopy(cd if conditions is None else conditions)
+        # The text is parsed once per run, both outputs are rendered from the parsed lines
+        self.parser = tir.TranscriptParser(self.conditions)
+        self.powerpoint_formatter = inc.IncrementalFormatter(self.conditions)
+        self.output_powerpoint = ""
+        self.output_oncue = ""
+        # Bumped whenever a result still in flight becomes stale
+        self.processing_generation = 0
+        self.import_generation = 0
+        # Set while a PDF import runs, cancelling it stops the extraction between pages
+        self.cancel_token = None
+        self.import_progress = None  # (pages_done, pages_total) of the running import
+        # Typed or pasted text is added to the search index, search results are not indexed again
+        self.searchable = True
+        self.indexed_digest = None  # content hash of the text last indexed
+        self.indexed_generation = 0
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+
+    def is_empty(self):
+        return not self.pdf_path and not self.input_text
+
+    def set_pdf(self, pdf_path):
+        """ Makes the PDF the session's source, the text is extracted by import_pdf """
+        self.pdf_path = pdf_path
+        self.imported_text = None
+        self.name = os.path.basename(pdf_path)
+
+    @property
+    def importing(self):
+        return self.cancel_token is not None
+
+    def start_import(self):
+        """ Arms a fresh cancel token for an import about to start and clears the text of the previous one """
+        self.cancel_token = cn.CancelToken()
+        self.import_progress = (0, 0)
+        self.imported_text = None
+        self.input_text = ""
+        self.import_generation += 1
+        return self.cancel_token
+
+    def end_import(self):
+        self.cancel_token = None
+        self.import_progress = None
+
+    def cancel_import(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+
+    def clear(self):
+        self.cancel_import()
+        self.end_import()
+        self.pdf_path = None
+        self.imported_text = None
+        self.input_text = ""
+        self.output_powerpoint = ""
+        self.output_oncue = ""
+        self.name = untitled_name()
+        self.import_generation += 1
+        # A new document, the text indexed so far stays searchable
+        self.indexed_digest = None
+
+    def import_pdf(self, pdf_path, progress=None, cancel=None):
+        """
+        Runs on a worker thread, returns the highlighted text of the PDF.
+        progress is called as progress(pages_done, pages_total, partial_text) as pages finish, partial_text being
+        the text those pages add. cancel is passed on to pdf_intake.extract_highlight_blocks.
+        """
+        def report(done, total, blocks):
+            progress(done, total, hb.format_highlight_blocks(blocks)[0])
+
+        result = pc.get_highlighted_text(pdf_path, report if progress else None, cancel)
+        return result[0]
+
+    def process(self, pdf_path, the_text):
+        """
+        Runs on a worker thread, returns (PowerPoint output, OnCue output).
+        The PDF is read through the cache when the session has one, otherwise the_text is formatted.
+        """
+        with self._lock, tracing.stage("gui.process") as span:
+            if pdf_path:
+                the_text = self.import_pdf(pdf_path)
+            transcript = self.parser.parse(the_text)
+            output_powerpoint, output_oncue = tir.render(transcript, (self.powerpoint_formatter.render,
+                                                                      fo.render_oncue))
+            span.set(characters=len(the_text))
+        return output_powerpoint, output_oncue
+
+    def index_text(self, generation, the_text):
+        """
+        Runs on a worker thread, adds the_text to the search index under its content hash in place of the version the
+        session indexed before. generation is the processing run the text was formatted in, text from a run older
+        than the one last indexed is dropped.
+        """
+        import transcript_index as ti  # The index database is only opened once there is text to add
+
+        digest = hashlib.sha256(the_text.encode('utf-8')).hexdigest()
+        with self._index_lock:
+            if generation < self.indexed_generation or digest == self.indexed_digest:
+                return
+            line_table = hb.text_line_table(the_text)
+            if line_table:
+                ti.add_transcript(digest, self.name, line_table, replaces=self.indexed_digest)
+                self.indexed_digest = digest
+            self.indexed_generation = generation
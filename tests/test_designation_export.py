@@ -0,0 +1,75 @@
+import csv
+import os
+import designation_export as de
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_read_tags(tmp_path):
+    tags_path = write(tmp_path / "tags.csv",
+                      "deposition,party,issue\nsmith.pdf,Plaintiff,Damages\njones, Defendant ,\n,Nobody,Nothing\n"
+                      "Smith v. Jones,Plaintiff,\n")
+    assert de.read_tags(tags_path) == {'smith.pdf': ('Plaintiff', 'Damages'), 'jones': ('Defendant', ''),
+                                       'Smith v. Jones': ('Plaintiff', '')}
+
+
+def test_read_tags_needs_deposition_column(tmp_path):
+    tags_path = write(tmp_path / "tags.csv", "name,party\nsmith,Plaintiff\n")
+    try:
+        de.read_tags(tags_path)
+    except ValueError:
+        return
+    raise AssertionError("a tags file without a deposition column was accepted")
+
+
+def test_export_tags_each_deposition(tmp_path):
+    smith = write(tmp_path / "smith.txt", "--- Page 4:3-9: \n--- Page 4:8-12: \n--- Page 3:25-25: \n")
+    jones = write(tmp_path / "jones.txt", "--- Page 7:1-2: \n")
+    doe = write(tmp_path / "doe.txt", "--- Page 1:5-6: \n")
+    csv_path = str(tmp_path / "designations.csv")
+    oncue_dir = tmp_path / "oncue"
+    summary = de.export_designations([smith, jones, doe], csv_path, str(oncue_dir),
+                                     tags={'smith': ('Plaintiff', 'Damages'), 'jones': ('Defendant', 'Liability')},
+                                     default_tags=('Third party', ''), workers=1)
+
+    assert (summary['succeeded'], summary['failed'], summary['designations']) == (3, 0, 4)
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [list(de.CSV_COLUMNS),
+                    ['smith', '3:25-25', '3', '25', '3', '25', 'Plaintiff', 'Damages'],
+                    ['smith', '4:3-12', '4', '3', '4', '12', 'Plaintiff', 'Damages'],
+                    ['jones', '7:1-2', '7', '1', '7', '2', 'Defendant', 'Liability'],
+                    ['doe', '1:5-6', '1', '5', '1', '6', 'Third party', '']]
+    assert (oncue_dir / "smith.oncue.txt").read_text(encoding='utf-8') == "3:25-25\n4:3-12"
+
+
+def test_shared_names_are_told_apart(tmp_path):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+    first = write(tmp_path / "a" / "smith.txt", "--- Page 1:1-2: \n")
+    second = write(tmp_path / "b" / "smith.txt", "--- Page 2:3-4: \n")
+    jones = write(tmp_path / "a" / "jones.txt", "--- Page 5:6-7: \n")
+    jones_pdf = str(tmp_path / "a" / "jones.pdf")
+    assert de.deposition_names([first, second, jones, jones_pdf]) == {
+        first: os.path.join("a", "smith.txt"), second: os.path.join("b", "smith.txt"), jones: "jones.txt",
+        jones_pdf: "jones.pdf"}
+
+    oncue_dir = tmp_path / "oncue"
+    summary = de.export_designations([first, second, jones], str(tmp_path / "out.csv"), str(oncue_dir),
+                                     tags={os.path.join("a", "smith.txt"): ("Plaintiff", ""), "smith": ("Nobody", ""),
+                                           "jones.txt": ("Defendant", "")}, workers=1)
+    assert [(entry['deposition'], entry['status']) for entry in summary['depositions']] == [
+        (os.path.join("a", "smith.txt"), 'ok'), (os.path.join("b", "smith.txt"), 'ok'), ("jones", 'ok')]
+    with open(tmp_path / "out.csv", encoding='utf-8', newline='') as f:
+        assert [(row[0], row[6]) for row in list(csv.reader(f))[1:]] == [
+            (os.path.join("a", "smith.txt"), 'Plaintiff'), (os.path.join("b", "smith.txt"), ''), ('jones', 'Defendant')]
+    assert (oncue_dir / "a" / "smith.txt.oncue.txt").read_text(encoding='utf-8') == "1:1-2"
+    assert (oncue_dir / "b" / "smith.txt.oncue.txt").read_text(encoding='utf-8') == "2:3-4"
+
+
+def test_unreadable_deposition_is_reported(tmp_path):
+    summary = de.export_designations([str(tmp_path / "missing.txt")], str(tmp_path / "out.csv"), workers=1)
+    assert summary['failed'] == 1 and summary['depositions'][0]['status'] == 'failed'
@@ -0,0 +1,75 @@
+import format_oncue as fo
+from designations import Designation, merge_designations
+
+
+def parse_all(*texts):
+    return [Designation.parse(text) for text in texts]
+
+
+def test_parse_forms():
+    assert Designation.parse("12:3-9") == Designation(12, 3, 12, 9)
+    assert Designation.parse("12:3-9:") == Designation(12, 3, 12, 9)
+    assert Designation.parse("12:20-13:4") == Designation(12, 20, 13, 4)
+    assert Designation.parse("12:20-13:4:") == Designation(12, 20, 13, 4)
+    assert Designation.parse("5:7-7") == Designation(5, 7, 5, 7)
+
+
+def test_parse_rejects_non_designations():
+    assert Designation.parse("Page 12") is None
+    assert Designation.parse("12:3") is None
+    assert Designation.parse("10:30-11:45 am") is None
+
+
+def test_parse_rejects_reversed_ranges():
+    assert Designation.parse("5:9-3") is None
+    assert Designation.parse("12:20-11:4") is None
+    assert Designation.parse("12:20-12:4") is None
+
+
+def test_render_round_trip():
+    for text in ("12:3-9", "12:20-13:4", "1:1-1"):
+        assert Designation.parse(text).render() == text
+
+
+def test_merge_overlapping():
+    assert merge_designations(parse_all("1:5-10", "1:8-15")) == parse_all("1:5-15")
+
+
+def test_merge_contained():
+    assert merge_designations(parse_all("1:1-20", "1:5-10")) == parse_all("1:1-20")
+
+
+def test_merge_adjacent_lines():
+    assert merge_designations(parse_all("1:1-4", "1:5-9")) == parse_all("1:1-9")
+
+
+def test_gap_is_kept():
+    assert merge_designations(parse_all("1:1-4", "1:6-9")) == parse_all("1:1-4", "1:6-9")
+
+
+def test_merge_across_page_break():
+    # Line 25 is the last line of a page, line 1 of the next page follows it
+    assert merge_designations(parse_all("3:20-25", "4:1-6")) == parse_all("3:20-4:6")
+    assert merge_designations(parse_all("3:20-24", "4:1-6")) == parse_all("3:20-24", "4:1-6")
+
+
+def test_merge_page_spans():
+    assert merge_designations(parse_all("3:20-4:5", "4:3-4:10")) == parse_all("3:20-4:10")
+    assert merge_designations(parse_all("4:3-9", "3:20-4:5")) == parse_all("3:20-4:9")
+
+
+def test_merge_duplicates():
+    assert merge_designations(parse_all("2:1-5", "2:1-5", "2:1-5")) == parse_all("2:1-5")
+
+
+def test_merge_sorts():
+    assert merge_designations(parse_all("9:1-2", "2:1-2", "5:1-2")) == parse_all("2:1-2", "5:1-2", "9:1-2")
+
+
+def test_merge_lines_per_page():
+    assert merge_designations(parse_all("1:30-30", "2:1-2"), lines_per_page=30) == parse_all("1:30-2:2")
+
+
+def test_oncue_output():
+    text = "--- Page 4:3-9: \nQ. x\n--- Page 4:8-12: \n--- Page 3:25-25: \n--- Page 5:9-3: \n"
+    assert fo.prepare_text_for_oncue(text) == "3:25-25\n4:3-12"
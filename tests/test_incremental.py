@@ -0,0 +1,79 @@
+import io
+import random
+import format_powerpoint as fp
+import incremental as inc
+
+LINES = [
+    "Q.  Did you go to Shanghai in May?",
+    "A.  Yes, I did.",
+    "MR. SMITH:  Objection, form.",
+    "MS. LEE: Join.",
+    "THE VIDEOGRAPHER: Off the record.",
+    "the record continues here and there",
+    "BY MR. JONES:",
+    "THE WITNESS: I don't recall.",
+    "",
+    "QUESTIONS BY MS. LEE:",
+    "A.",
+    "Q.",
+    "continued",
+]
+
+
+def transcript_text(seed, line_count):
+    """ A pdf_intake-like transcript of random lines, numbered and split into "--- Page" sections """
+    rng = random.Random(seed)
+    lines = []
+    for i in range(line_count):
+        if i % 25 == 0 and rng.random() < 0.5:
+            lines.append(f"--- Page {i // 25 + 1}:{rng.randint(1, 5)}-{rng.randint(6, 25)}: ")
+        line = rng.choice(LINES)
+        lines.append(f"{i % 25 + 1} {line}" if rng.random() < 0.8 else line)
+    return "\n".join(lines)
+
+
+def edited(text, seed):
+    """ The text with one line replaced, inserted or deleted """
+    rng = random.Random(seed)
+    lines = text.split("\n")
+    position = rng.randrange(len(lines) + 1)
+    edit = rng.choice(("replace", "insert", "delete"))
+    if edit == "insert" or position == len(lines):
+        lines.insert(position, rng.choice(LINES))
+    elif edit == "replace":
+        lines[position] = rng.choice(LINES)
+    else:
+        del lines[position]
+    return "\n".join(lines)
+
+
+def test_matches_full_reformat():
+    formatter = inc.IncrementalFormatter()
+    for seed in range(200):
+        text = transcript_text(seed, random.Random(seed).randint(0, 80))
+        assert formatter.prepare_text_for_powerpoint(text) == fp.prepare_text_for_powerpoint(text), seed
+
+
+def test_matches_full_reformat_across_edits():
+    # The same formatter sees every revision, so later runs are served from the block memo
+    formatter = inc.IncrementalFormatter()
+    text = transcript_text(0, 60)
+    for seed in range(300):
+        text = edited(text, seed)
+        assert formatter.prepare_text_for_powerpoint(text) == fp.prepare_text_for_powerpoint(text), seed
+
+
+def test_rule_change_drops_memo():
+    conditions = {"qa_phrases": ["Q.", "A."], "objection_phrases": ["MR", "MS"],
+                  "non_party_phrases": ["THE VIDEOGRAPHER"], "swap_phrase_dict": {"THE WITNESS:": "A."}}
+    formatter = inc.IncrementalFormatter(conditions)
+    text = transcript_text(3, 60)
+    formatter.prepare_text_for_powerpoint(text)
+    conditions["objection_phrases"].append("MRS")
+    assert formatter.prepare_text_for_powerpoint(text) == fp.prepare_text_for_powerpoint(text, conditions)
+
+
+def test_streaming_matches_full_reformat():
+    for seed in range(100):
+        text = transcript_text(seed, random.Random(seed).randint(0, 80))
+        assert "".join(fp.stream_text_for_powerpoint(io.StringIO(text))) == fp.prepare_text_for_powerpoint(text)
@@ -0,0 +1,106 @@
+import random
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+import benchmark as bm
+import pdf_intake as pd
+
+
+def expected_blocks(pages, highlighted_pages, highlights_per_page=1, seed=0):
+    """ The blocks benchmark.make_highlighted_pdf highlights, worked out from its generators """
+    rng = random.Random(seed)
+    blocks = []
+    for page_num, lines in enumerate(bm.generate_transcript_pages(pages, seed)):
+        if page_num in highlighted_pages:
+            for first, last in bm.highlight_spans(rng, highlights_per_page):
+                # Words are joined with single spaces
+                text = "".join(f"{row + 1} {' '.join(lines[row].split())}\n" for row in range(first, last + 1))
+                blocks.append((f"{page_num + 1}:{first + 1}-{last + 1}", text))
+    return blocks
+
+
+def test_only_highlighted_pages_are_indexed(tmp_path):
+    pdf_path = bm.make_highlighted_pdf(str(tmp_path / "t.pdf"), 6, highlighted_pages=[1, 4])
+    doc = fitz.open(pdf_path)
+    assert pd.highlighted_page_numbers(doc) == [1, 4]
+    doc.close()
+
+
+def test_indirect_annots_array(tmp_path):
+    doc = fitz.open(bm.make_highlighted_pdf(str(tmp_path / "direct.pdf"), 3, highlighted_pages=[2]))
+    # Move the page's /Annots array into an object of its own, as some PDF writers do
+    page_xref = doc.page_xref(2)
+    kind, annots = doc.xref_get_key(page_xref, "Annots")
+    assert kind == "array"
+    annots_xref = doc.get_new_xref()
+    doc.update_object(annots_xref, annots)
+    doc.xref_set_key(page_xref, "Annots", f"{annots_xref} 0 R")
+    pdf_path = str(tmp_path / "indirect.pdf")
+    doc.save(pdf_path)
+    doc.close()
+
+    doc = fitz.open(pdf_path)
+    assert doc.xref_get_key(doc.page_xref(2), "Annots")[0] == "xref"
+    assert pd.highlighted_page_numbers(doc) == [2]
+    doc.close()
+    assert pd.extract_highlight_blocks(pdf_path) == expected_blocks(3, [2])
+
+
+def test_workers_match_serial(tmp_path):
+    pdf_path = bm.make_highlighted_pdf(str(tmp_path / "t.pdf"), 12, highlighted_pages=range(1, 12, 2),
+                                       highlights_per_page=2, seed=3)
+    serial = pd.extract_highlighted_text_with_coordinates(pdf_path, 1)
+    assert pd.extract_highlighted_text_with_coordinates(pdf_path, 3) == serial
+    assert serial[1] == [cite for cite, _ in expected_blocks(12, range(1, 12, 2), 2, seed=3)]
+
+
+def test_cites_and_text(tmp_path):
+    pdf_path = bm.make_highlighted_pdf(str(tmp_path / "t.pdf"), 4, highlighted_pages=[0, 2, 3],
+                                       highlights_per_page=3, seed=1)
+    assert pd.extract_highlight_blocks(pdf_path) == expected_blocks(4, [0, 2, 3], 3, seed=1)
+
+
+def write_page(doc, lines, gutter_last=False, numbered=True):
+    """ A transcript page, its line numbers written before or after the testimony, with every line highlighted """
+    page = doc.new_page(width=bm.PAGE_WIDTH, height=bm.PAGE_HEIGHT)
+    font = fitz.Font("helv")
+    writer = fitz.TextWriter(page.rect)
+    rows = list(enumerate(lines))
+    numbers = [((bm.LINE_NUMBER_X, bm.FIRST_LINE_Y + row * bm.LINE_SPACING), f"{row + 1:>2}") for row, _ in rows
+               if numbered]
+    texts = [((bm.TEXT_X, bm.FIRST_LINE_Y + row * bm.LINE_SPACING), line) for row, line in rows]
+    for position, text in texts + numbers if gutter_last else numbers + texts:
+        writer.append(position, text, font=font, fontsize=11)
+    writer.write_text(page)
+    page.add_highlight_annot([fitz.Rect(bm.LINE_NUMBER_X - 4, bm.FIRST_LINE_Y + row * bm.LINE_SPACING - 11,
+                                        bm.PAGE_WIDTH - 50, bm.FIRST_LINE_Y + row * bm.LINE_SPACING + 3).quad
+                              for row, _ in rows])
+
+
+def test_gutter_written_after_text(tmp_path):
+    lines = bm.generate_transcript_pages(1)[0][:6]
+    paths = []
+    for gutter_last in (False, True):
+        doc = fitz.open()
+        write_page(doc, lines, gutter_last)
+        paths.append(str(tmp_path / f"gutter_last_{gutter_last}.pdf"))
+        doc.save(paths[-1])
+        doc.close()
+    expected = [("1:1-6", "".join(f"{row + 1} {' '.join(line.split())}\n" for row, line in enumerate(lines)))]
+    assert [pd.extract_highlight_blocks(path) for path in paths] == [expected, expected]
+
+
+def test_too_few_numbers_for_a_gutter(tmp_path):
+    pdf_path = str(tmp_path / "short.pdf")
+    doc = fitz.open()
+    # Two numbers are no gutter column, each is paired with the row it starts
+    for gutter_last in (False, True):
+        write_page(doc, ["Q.  Where were you?", "A.  At the office."], gutter_last)
+    # Without numbers the text is read in its layout order
+    write_page(doc, ["Q.  Where were you?", "A.  At the office."], numbered=False)
+    doc.save(pdf_path)
+    doc.close()
+    assert pd.extract_highlight_blocks(pdf_path) == [("1:1-2", "1 Q. Where were you?\n2 A. At the office.\n"),
+                                                     ("2:1-2", "1 Q. Where were you?\n2 A. At the office.\n"),
+                                                     ("3", "Q.  Where were you?\nA.  At the office.\n")]
@@ -0,0 +1,50 @@
+import random
+import processing_functions as pf
+
+
+def replace_longest_first(line, swap_phrase_dict):
+    """ Reference: one left-to-right scan, the longest phrase at each position wins, replacements are not rescanned """
+    phrases = sorted(swap_phrase_dict, key=len, reverse=True)
+    out = []
+    position = 0
+    while position < len(line):
+        for phrase in phrases:
+            if phrase and line.startswith(phrase, position):
+                out.append(swap_phrase_dict[phrase])
+                position += len(phrase)
+                break
+        else:
+            out.append(line[position])
+            position += 1
+    return "".join(out)
+
+
+def test_default_swap():
+    assert pf.replace_words("THE WITNESS: Yes.", {"THE WITNESS:": "A."}) == "A. Yes."
+
+
+def test_longest_phrase_wins():
+    swaps = {"MR": "X", "MR.": "Y", "MR. SMITH": "Z"}
+    assert pf.replace_words("MR. SMITH and MR. and MR", swaps) == "Z and Y and X"
+
+
+def test_replacements_are_not_rescanned():
+    assert pf.replace_words("ab", {"a": "b", "b": "c"}) == "bc"
+
+
+def test_regex_characters_are_literal():
+    assert pf.replace_words("a.b a*b (x)", {"a.b": "1", "(x)": "2"}) == "1 a*b 2"
+
+
+def test_empty_dictionary():
+    assert pf.replace_words("unchanged", {}) == "unchanged"
+
+
+def test_matches_reference_scan():
+    rng = random.Random(9)
+    alphabet = "ab. :"
+    for _ in range(2000):
+        swaps = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))): rng.choice(["X", "YY", ""])
+                 for _ in range(rng.randint(1, 6))}
+        line = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert pf.replace_words(line, swaps) == replace_longest_first(line, swaps), (line, swaps)
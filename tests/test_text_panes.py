@@ -0,0 +1,75 @@
+import random
+from text_panes import changed_line_range
+
+
+def apply(old_lines, new_lines):
+    prefix, old_end, new_end = changed_line_range(old_lines, new_lines)
+    return old_lines[:prefix] + new_lines[prefix:new_end] + old_lines[old_end:]
+
+
+def test_identical():
+    assert changed_line_range(["a", "b"], ["a", "b"]) == (2, 2, 2)
+
+
+def test_single_line_change():
+    assert changed_line_range(["a", "b", "c"], ["a", "x", "c"]) == (1, 2, 2)
+
+
+def test_insert_and_delete():
+    assert changed_line_range(["a", "c"], ["a", "b", "c"]) == (1, 1, 2)
+    assert changed_line_range(["a", "b", "c"], ["a", "c"]) == (1, 2, 1)
+
+
+def test_repeated_lines_do_not_overlap():
+    # The unchanged head and tail may not claim the same line twice
+    assert apply(["a", "a"], ["a", "a", "a"]) == ["a", "a", "a"]
+    assert apply(["a", "a", "a"], ["a"]) == ["a"]
+
+
+def test_random_edits_reconstruct_new_lines():
+    rng = random.Random(4)
+    for _ in range(3000):
+        old_lines = [rng.choice("abc") for _ in range(rng.randint(0, 12))]
+        new_lines = list(old_lines)
+        for _ in range(rng.randint(0, 3)):
+            position = rng.randint(0, len(new_lines))
+            if new_lines and rng.random() < 0.5:
+                del new_lines[min(position, len(new_lines) - 1)]
+            else:
+                new_lines.insert(position, rng.choice("abcd"))
+        prefix, old_end, new_end = changed_line_range(old_lines, new_lines)
+        assert prefix <= old_end and prefix <= new_end
+        assert apply(old_lines, new_lines) == new_lines
+
+
+def test_pane_writer_follows_writes_and_user_edits():
+    import os
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication, QPlainTextEdit
+    from text_panes import PaneWriter
+
+    app = QApplication.instance() or QApplication([])
+    pane = QPlainTextEdit()
+    writer = PaneWriter(pane, chunk_lines=8)
+    rng = random.Random(11)
+    text = ""
+    for step in range(400):
+        lines = text.split("\n") if text else []
+        for _ in range(rng.randint(0, 3)):
+            position = rng.randint(0, len(lines))
+            if lines and rng.random() < 0.4:
+                del lines[min(position, len(lines) - 1)]
+            else:
+                lines.insert(position, rng.choice(["Q. a", "A. b", "", "MR. X: c"]))
+        if rng.random() < 0.05:
+            lines = [str(i) for i in range(rng.randint(0, 30))]
+        text = "\n".join(lines)
+        if rng.random() < 0.1:
+            # The user types into the output pane, the next write has to start from what the pane really holds
+            pane.appendPlainText("typed by hand")
+        writer.set_text(text)
+        writer.flush()
+        assert pane.toPlainText() == text, step
+    writer.clear()
+    assert pane.toPlainText() == "" and writer.lines == []
+    app.processEvents()
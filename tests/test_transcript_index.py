@@ -0,0 +1,22 @@
+import highlight_blocks as hb
+import transcript_index as ti
+
+PASTED = "\n--- Page 7:1-2: \n1 Q. Where is the zeppelin hangar?\n2 A. Behind the barn. ---\n"
+
+
+def test_text_line_table_matches_blocks():
+    blocks = [("7:1-2", "1 Q. Where is the zeppelin hangar?\n2 A. Behind the barn."), ("9:4-4", "4 Q. Which barn?")]
+    text, _ = hb.format_highlight_blocks(blocks)
+    assert hb.text_line_table(text) == hb.build_line_table(blocks)
+    assert hb.text_line_table("1 no page header yet\n" + PASTED) == hb.build_line_table(blocks[:1])
+
+
+def test_replaced_version_is_no_longer_found(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    ti.add_transcript("v1", "Untitled 1", hb.text_line_table(PASTED), path=path)
+    assert [(hit.name, hit.page, hit.line) for hit in ti.search("zeppelin hangar", path)] == [("Untitled 1", 7, 1)]
+
+    edited = PASTED.replace("zeppelin", "blimp")
+    ti.add_transcript("v2", "Untitled 1", hb.text_line_table(edited), path=path, replaces="v1")
+    assert ti.search("zeppelin", path) == []
+    assert [hit.digest for hit in ti.search("blimp", path)] == ["v2"]
@@ -0,0 +1,126 @@
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor
+
+""" Output Pane Updates """
+
+CHUNK_LINES = 2000  # Lines laid out per event loop turn when a large output is written progressively
+
+
+def changed_line_range(old_lines, new_lines):
+    """
+    Returns (prefix, old_end, new_end): old_lines[prefix:old_end] has to be replaced by new_lines[prefix:new_end],
+    everything before prefix and from old_end/new_end onwards is unchanged.
+    """
+    limit = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    return prefix, len(old_lines) - suffix, len(new_lines) - suffix
+
+
+class PaneWriter(QObject):
+    """
+    Writes text into a QPlainTextEdit.
+
+    When the pane already holds a previous output, only the run of lines between the unchanged head and tail is
+    replaced through a QTextCursor edit, so the refresh costs as much as the change and the scroll position and
+    cursor are kept. The lines last written are kept, so the diff only reads the document back after the user edited
+    the pane. A first write or a large rewrite is set one chunk of lines per event loop turn, so the window
+    keeps repainting and responding while a full-transcript output is laid out.
+    """
+
+    def __init__(self, pane, chunk_lines=CHUNK_LINES):
+        super().__init__(pane)
+        self.pane = pane
+        self.chunk_lines = chunk_lines
+        self.pending_lines = []
+        self.lines = []  # Every line written so far, pending chunks included, None once the user edited the pane
+        self.writing = False
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.append_next_chunk)
+        pane.document().contentsChanged.connect(self.on_contents_changed)
+
+    def on_contents_changed(self):
+        if not self.writing:
+            self.lines = None
+
+    def set_text(self, text):
+        """ Replaces the pane contents, dropping any chunks still pending from a previous call """
+        self.timer.stop()
+        lines = text.split('\n')
+        if not self.pending_lines and not self.pane.document().isEmpty():
+            old_lines = self.lines if self.lines is not None else self.pane.toPlainText().split('\n')
+            prefix, old_end, new_end = changed_line_range(old_lines, lines)
+            if new_end - prefix <= self.chunk_lines:
+                self.replace_lines(old_lines, prefix, old_end, lines[prefix:new_end])
+                self.lines = lines
+                return
+        self.write_progressively(lines)
+
+    def replace_lines(self, old_lines, prefix, old_end, new_lines):
+        """ Replaces blocks prefix..old_end-1 of the pane with new_lines in a single cursor edit """
+        if prefix == old_end and not new_lines:
+            return
+        document = self.pane.document()
+        cursor = QTextCursor(document)
+        if old_end < len(old_lines):
+            # Unchanged lines follow: replace whole blocks up to the first of them, newlines included
+            cursor.setPosition(document.findBlockByNumber(prefix).position())
+            cursor.setPosition(document.findBlockByNumber(old_end).position(), QTextCursor.KeepAnchor)
+            replacement = "".join(line + '\n' for line in new_lines)
+        elif prefix == 0:
+            cursor.select(QTextCursor.Document)
+            replacement = '\n'.join(new_lines)
+        else:
+            # The change runs to the end: start after the last unchanged line, before its newline
+            previous_block = document.findBlockByNumber(prefix - 1)
+            cursor.setPosition(previous_block.position() + previous_block.length() - 1)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            replacement = "".join('\n' + line for line in new_lines)
+
+        scroll_bar = self.pane.verticalScrollBar()
+        scroll_position = scroll_bar.value()
+        self.writing = True
+        cursor.beginEditBlock()
+        cursor.insertText(replacement)
+        cursor.endEditBlock()
+        self.writing = False
+        scroll_bar.setValue(scroll_position)
+
+    def write_progressively(self, lines):
+        self.writing = True
+        if len(lines) <= self.chunk_lines:
+            self.pending_lines = []
+            self.pane.setPlainText('\n'.join(lines))
+        else:
+            self.pane.setPlainText('\n'.join(lines[:self.chunk_lines]))
+            self.pending_lines = lines[self.chunk_lines:]
+            self.timer.start()
+        self.writing = False
+        self.lines = lines
+
+    def append_next_chunk(self):
+        chunk, self.pending_lines = self.pending_lines[:self.chunk_lines], self.pending_lines[self.chunk_lines:]
+        # appendPlainText starts a new block, which stands in for the newline the split removed
+        self.writing = True
+        self.pane.appendPlainText('\n'.join(chunk))
+        self.writing = False
+        if not self.pending_lines:
+            self.timer.stop()
+
+    def flush(self):
+        """ Appends whatever is still pending, e.g. before the pane's text is copied """
+        while self.pending_lines:
+            self.append_next_chunk()
+
+    def clear(self):
+        self.timer.stop()
+        self.pending_lines = []
+        self.writing = True
+        self.pane.clear()
+        self.writing = False
+        self.lines = []
@@ -0,0 +1,166 @@
+import atexit
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+
+""" Pipeline Stage Tracing """
+
+TRACE_ENV = "TRANSCRIPT_TRACE"  # Set to a file path (or 1) to dump a Chrome trace when the process exits
+TRACE_OWNER_ENV = "TRANSCRIPT_TRACE_OWNER"  # Pid of the process that owns the trace file, inherited by workers
+DEFAULT_TRACE_PATH = "transcript_trace.json"
+MAX_TRACE_EVENTS = 200000
+
+_enabled = False
+_recording_events = False
+_lock = threading.Lock()
+_latest = {}  # stage name -> {'seconds', 'counts', 'calls'}
+_events = []  # Chrome trace "complete" events
+_origin = time.perf_counter()
+_trace_file = None  # Kept alive for the after-fork registry, which only holds a weak reference
+
+
+class _NullSpan:
+    """ Returned while tracing is disabled, so an instrumented stage costs one call and a flag check """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **counts):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        record(self.name, self.start, end, self.counts)
+        return False
+
+    def set(self, **counts):
+        """ Attach item counts (pages, annotations, lines...) that are only known once the stage has run """
+        self.counts.update(counts)
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def stage(name, **counts):
+    """
+    Context manager timing one pipeline stage:
+
+        with tracing.stage("pdf.extract") as span:
+            ...
+            span.set(pages=page_count)
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, counts)
+
+
+def record(name, start, end, counts):
+    with _lock:
+        latest = _latest.get(name)
+        calls = latest['calls'] + 1 if latest else 1
+        _latest[name] = {'seconds': end - start, 'counts': dict(counts), 'calls': calls}
+        if _recording_events and len(_events) < MAX_TRACE_EVENTS:
+            _events.append({'name': name, 'cat': name.split('.')[0], 'ph': 'X',
+                            'ts': (start - _origin) * 1e6, 'dur': (end - start) * 1e6,
+                            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': dict(counts)})
+
+
+def last_timings():
+    """ {stage: {'seconds', 'counts', 'calls'}} for the latest run of every stage """
+    with _lock:
+        return {name: dict(timing) for name, timing in _latest.items()}
+
+
+def summary_text(names=None):
+    """ One-line readout of the latest timings, e.g. "pdf.extract 120 ms (pages 40)  |  gui.process 8 ms" """
+    timings = last_timings()
+    parts = []
+    for name in names or sorted(timings):
+        timing = timings.get(name)
+        if timing is None:
+            continue
+        part = f"{name} {timing['seconds'] * 1000:.0f} ms"
+        if timing['counts']:
+            part += " (" + ", ".join(f"{key} {value}" for key, value in timing['counts'].items()) + ")"
+        parts.append(part)
+    return "  |  ".join(parts)
+
+
+def dump_chrome_trace(path):
+    """ Writes the recorded events in Chrome trace format, for chrome://tracing or Perfetto """
+    with _lock:
+        events = list(_events)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def _dump_at_exit(path):
+    # Worker processes inherit the environment, give each its own file instead of overwriting the parent's
+    if os.environ.get(TRACE_OWNER_ENV) != str(os.getpid()):
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{os.getpid()}{ext}"
+    dump_chrome_trace(path)
+
+
+class _TraceFile:
+    def __init__(self, path):
+        self.path = path
+
+
+def _start_worker_trace(trace_file):
+    """
+    Runs in a forked multiprocessing child. Pool workers end through os._exit, which skips atexit, so the dump is
+    registered as a multiprocessing finalizer instead, which the worker runs as it shuts down. The events inherited
+    from the parent are not the child's to write.
+    """
+    with _lock:
+        _events.clear()
+    multiprocessing.util.Finalize(None, _dump_at_exit, args=(trace_file.path,), exitpriority=0)
+
+
+def _configure_from_environment():
+    global _recording_events, _trace_file
+    trace_path = os.environ.get(TRACE_ENV)
+    if not trace_path:
+        return
+    if trace_path == "1":
+        trace_path = DEFAULT_TRACE_PATH
+    enable()
+    _recording_events = True
+    os.environ.setdefault(TRACE_OWNER_ENV, str(os.getpid()))
+    atexit.register(_dump_at_exit, trace_path)
+    _trace_file = _TraceFile(trace_path)
+    multiprocessing.util.register_after_fork(_trace_file, _start_worker_trace)
+
+
+_configure_from_environment()
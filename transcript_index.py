@@ -0,0 +1,266 @@
+import argparse
+import bisect
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+import metadata as meta
+import transcript_store as ts
+
+""" Search Index Across Transcripts """
+
+DATABASE_NAME = "transcript_index.sqlite3"
+MAX_INDEX_BYTES = 128 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_documents (
+    digest TEXT PRIMARY KEY,
+    build INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    lines TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_postings (
+    term TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    positions TEXT NOT NULL,
+    PRIMARY KEY (term, digest)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS index_postings_digest ON index_postings (digest);
+"""
+
+TERM_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+MAX_LOADED_DOCUMENTS = 64
+
+Hit = namedtuple('Hit', 'name digest page line text')
+
+_documents = {}  # digest -> (name, lines, line_starts), loaded on first use
+_lock = threading.Lock()
+
+
+def database_path():
+    """ The index is kept beside the transcript store, in a file of its own with its own size limit """
+    return os.path.join(ts.cache_dir(), DATABASE_NAME)
+
+
+def open_index(path=None):
+    return ts.open_database(path or database_path(), SCHEMA)
+
+
+def terms(text):
+    """ Lower-cased words, apostrophes kept inside a word so "didn't" stays one term """
+    return TERM_RE.findall(text.lower())
+
+
+def document_lines(line_table):
+    """
+    Flattens a highlight_blocks.build_line_table table into [page, line, text] rows in transcript order, keeping one row
+    per page:line when overlapping highlights repeat a line. Page keys may be strings once the table went through JSON.
+    """
+    rows = {}
+    for page, page_lines in line_table.items():
+        for line, text in page_lines:
+            rows.setdefault((int(page), int(line)), text)
+    return [[page, line, text] for (page, line), text in sorted(rows.items())]
+
+
+def line_starts(lines):
+    """ The word position each row starts at, positions count words across the whole document """
+    starts = []
+    position = 0
+    for _, _, text in lines:
+        starts.append(position)
+        position += len(terms(text))
+    return starts
+
+
+def is_indexed(digest, path=None):
+    try:
+        with open_index(path) as connection:
+            row = connection.execute("SELECT 1 FROM index_documents WHERE digest = ? AND build = ?",
+                                     (digest, meta.build_number)).fetchone()
+        return row is not None
+    except (sqlite3.Error, OSError):
+        return False
+
+
+def add_transcript(digest, name, line_table, path=None, max_bytes=MAX_INDEX_BYTES, replaces=None):
+    """
+    Indexes one parsed transcript under its content hash, replacing any earlier entry for it, and evicts the least
+    recently searched transcripts until the index fits in max_bytes. replaces is the hash of an earlier version of the
+    same transcript to drop, e.g. pasted text before an edit.
+    Called as transcripts are parsed, so the index grows one deposition at a time and is never rebuilt wholesale.
+    Best effort like the transcript cache: an unwritable database leaves the transcript unindexed.
+    """
+    lines = document_lines(line_table)
+    postings = {}
+    position = 0
+    for _, _, text in lines:
+        for term in terms(text):
+            postings.setdefault(term, []).append(position)
+            position += 1
+    lines_data = json.dumps(lines)
+    postings_rows = [(term, digest, json.dumps(positions)) for term, positions in postings.items()]
+    size = len(lines_data) + sum(len(term) + len(positions) for term, _, positions in postings_rows)
+    try:
+        with open_index(path) as connection:
+            # Entries written by other pipeline builds may have been parsed differently
+            evicted = [row[0] for row in connection.execute("SELECT digest FROM index_documents WHERE build != ?",
+                                                            (meta.build_number,))]
+            if replaces is not None and replaces != digest:
+                evicted.append(replaces)
+            # Every entry but the ones this transcript rewrites counts towards the limit
+            others = (meta.build_number, digest, replaces or digest)
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM index_documents "
+                                       "WHERE build = ? AND digest NOT IN (?, ?)", others).fetchone()[0]
+            for old_digest, old_size in connection.execute(
+                    "SELECT digest, size FROM index_documents WHERE build = ? AND digest NOT IN (?, ?) "
+                    "ORDER BY last_access", others).fetchall():
+                if total + size <= max_bytes:
+                    break
+                evicted.append(old_digest)
+                total -= old_size
+            for old_digest in evicted + [digest]:
+                connection.execute("DELETE FROM index_postings WHERE digest = ?", (old_digest,))
+                connection.execute("DELETE FROM index_documents WHERE digest = ?", (old_digest,))
+            connection.execute("INSERT INTO index_documents VALUES (?, ?, ?, ?, ?, ?)",
+                               (digest, meta.build_number, name, lines_data, size, time.time()))
+            connection.executemany("INSERT INTO index_postings VALUES (?, ?, ?)", postings_rows)
+    except (sqlite3.Error, OSError):
+        return
+    with _lock:
+        _documents.pop(digest, None)
+        for old_digest in evicted:
+            _documents.pop(old_digest, None)
+
+
+def _document(connection, digest):
+    """ (name, lines, line_starts) of an indexed transcript, kept in memory once loaded """
+    with _lock:
+        document = _documents.get(digest)
+    if document is None:
+        name, lines = connection.execute("SELECT name, lines FROM index_documents WHERE digest = ?",
+                                         (digest,)).fetchone()
+        lines = json.loads(lines)
+        document = (name, lines, line_starts(lines))
+        with _lock:
+            if len(_documents) >= MAX_LOADED_DOCUMENTS:
+                _documents.clear()
+            _documents[digest] = document
+    return document
+
+
+def search(query, path=None):
+    """
+    Finds a term or a phrase in every indexed transcript. The words of a phrase have to follow each other, across
+    line and page breaks too. Returns one Hit per matching page:line, sorted by deposition name, page and line;
+    a phrase that spans lines hits each of them.
+    """
+    query_terms = terms(query)
+    if not query_terms:
+        return []
+    try:
+        with open_index(path) as connection:
+            by_term = {}
+            for term in set(query_terms):
+                rows = connection.execute(
+                    "SELECT p.digest, p.positions FROM index_postings p JOIN index_documents d "
+                    "ON d.digest = p.digest WHERE p.term = ? AND d.build = ?", (term, meta.build_number)).fetchall()
+                if not rows:
+                    return []
+                by_term[term] = dict(rows)
+
+            hits = []
+            found = set()
+            # Only depositions holding every term can hold the phrase
+            for digest in set.intersection(*(set(digests) for digests in by_term.values())):
+                starts = set(json.loads(by_term[query_terms[0]][digest]))
+                for offset, term in enumerate(query_terms[1:], 1):
+                    starts &= {position - offset for position in json.loads(by_term[term][digest])}
+                    if not starts:
+                        break
+                if starts:
+                    found.add(digest)
+                    hits.extend(_document_hits(_document(connection, digest), digest, starts, len(query_terms)))
+            # Depositions that are searched stay indexed the longest
+            connection.executemany("UPDATE index_documents SET last_access = ? WHERE digest = ?",
+                                   ((time.time(), digest) for digest in found))
+    except (sqlite3.Error, OSError):
+        return []
+    hits.sort(key=lambda hit: (hit.name, hit.page, hit.line))
+    return hits
+
+
+def _document_hits(document, digest, starts, length):
+    name, lines, starts_of_lines = document
+    rows = set()
+    for start in starts:
+        first = bisect.bisect_right(starts_of_lines, start) - 1
+        last = bisect.bisect_right(starts_of_lines, start + length - 1) - 1
+        rows.update(range(first, last + 1))
+    return [Hit(name, digest, lines[row][0], lines[row][1], lines[row][2]) for row in rows]
+
+
+def hits_by_document(hits):
+    """ {deposition name: hits} in the order the hits are sorted """
+    documents = {}
+    for hit in hits:
+        documents.setdefault(hit.name, []).append(hit)
+    return documents
+
+
+def hits_text(hits):
+    """
+    Renders one deposition's hits as the text pdf_intake produces for highlights, one "--- Page p:a-b:" block per
+    run of consecutive lines, so it can be fed to the PowerPoint and OnCue formatters like an imported PDF.
+    """
+    blocks = []
+    run = []
+    for hit in hits:
+        if run and (hit.page != run[-1].page or hit.line != run[-1].line + 1):
+            blocks.append(run)
+            run = []
+        run.append(hit)
+    if run:
+        blocks.append(run)
+    return "".join(f"\n--- Page {run[0].page}:{run[0].line}-{run[-1].line}: \n"
+                   + "\n".join(f"{hit.line} {hit.text}" for hit in run) + " ---\n" for run in blocks)
+
+
+def clear(path=None):
+    """ Removes every indexed transcript """
+    with open_index(path) as connection:
+        connection.execute("DELETE FROM index_postings")
+        connection.execute("DELETE FROM index_documents")
+        connection.commit()
+        connection.execute("VACUUM")
+    with _lock:
+        _documents.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every transcript imported so far")
+    parser.add_argument("query", nargs="?", help="a word or a phrase")
+    parser.add_argument("--clear", action="store_true", help="remove every indexed transcript")
+    args = parser.parse_args(argv)
+    if args.clear:
+        clear()
+        print(f"cleared the index in {database_path()}")
+        return 0
+    if not args.query:
+        parser.error("a query is required")
+    hits = search(args.query)
+    for name, document_hits in hits_by_document(hits).items():
+        for hit in document_hits:
+            print(f"{name} {hit.page}:{hit.line}  {hit.text}")
+    print(f"{len(hits)} hits", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import re
+from operator import itemgetter
+import format_oncue as fo
+import processing_functions as pf
+import tracing
+from globals import conditions_dict as cd
+
+""" Parsed Transcript Lines """
+
+PAGE_HEADER_RE = re.compile(r'--- Page (\d+)')
+
+
+class TranscriptLine(tuple):
+    """
+    One transcript line as every output format sees it, parsed once:
+
+        page          the page of the latest "--- Page" header, None before the first one
+        number        the transcript line number the line started with, or None
+        kind          the processing_functions.LINE_* kind, None for a continuation line
+        text          the line after word swaps, without its line number
+        designations  the Designations the raw line cites, as a tuple
+    """
+    __slots__ = ()
+
+    page = property(itemgetter(0))
+    number = property(itemgetter(1))
+    kind = property(itemgetter(2))
+    text = property(itemgetter(3))
+    designations = property(itemgetter(4))
+
+    def __new__(cls, page, number, kind, text, designations=()):
+        return tuple.__new__(cls, (page, number, kind, text, designations))
+
+    def __repr__(self):
+        return f"TranscriptLine(page={self[0]}, number={self[1]}, kind={self[2]}, text={self[3]!r})"
+
+
+def parse_line(line, pattern, replace_words):
+    """
+    The part of a stripped line's parse that does not depend on the lines around it:
+    (number, kind, text, designations).
+    """
+    # The cites are read from the line as written, like format_oncue does
+    designations = tuple(filter(None, map(fo.designation_token, line.split()))) if ':' in line else ()
+    line = replace_words(line)
+    result = pf.detect_page_numbers(line, pf.LINE_NUMBER_RE.match(line))
+    return result['num'], pf.classify_line(result['line'], pattern), result['line'], designations
+
+
+class TranscriptParser:
+    """
+    Parses transcripts into TranscriptLines under one rule set.
+
+    The context-free part of every line of the latest parse is remembered, so re-parsing a transcript after an edit
+    only runs the regexes over the lines that changed.
+    """
+
+    def __init__(self, conditions=None):
+        # The rule set to apply, the globals default when None
+        self.conditions = cd if conditions is None else conditions
+        self._rules = None
+        self._parsed = {}  # stripped line -> parse_line result
+
+    def iter_lines(self, lines, remember=False):
+        """ Yields a TranscriptLine for every line of any iterable of lines, such as an open file """
+        rules = pf.conditions_key(self.conditions)
+        if rules != self._rules:
+            self._rules = rules
+            self._parsed = {}
+        pattern = pf.compile_conditions(self.conditions)
+        replace_words = pf.compile_swaps(self.conditions['swap_phrase_dict'])
+        previous = self._parsed
+        parsed = {}
+        page = None
+        for line in lines:
+            line = line.strip()
+            fields = parsed.get(line) or previous.get(line)
+            if fields is None:
+                fields = parse_line(line, pattern, replace_words)
+            if remember:
+                parsed[line] = fields
+            number, kind, text, designations = fields
+            if kind == pf.LINE_PAGE_HEADER:
+                match = PAGE_HEADER_RE.match(text)
+                if match:
+                    page = int(match.group(1))
+            yield TranscriptLine(page, number, kind, text, designations)
+        if remember:
+            # Only the lines of the current transcript are kept, so the memo tracks the document being edited
+            self._parsed = parsed
+
+    def parse(self, text):
+        """ Parses a whole transcript into a list of TranscriptLines """
+        with tracing.stage("transcript.parse") as span:
+            transcript = list(self.iter_lines(pf.split_text(text), remember=True))
+            span.set(lines=len(transcript))
+        return transcript
+
+
+def iter_transcript(lines, conditions=None):
+    """ Streams TranscriptLines from any iterable of lines without remembering them """
+    return TranscriptParser(conditions).iter_lines(lines)
+
+
+def parse_transcript(text, conditions=None):
+    return TranscriptParser(conditions).parse(text)
+
+
+def render(transcript, renderers, executor=None):
+    """
+    Runs every renderer over the same parsed transcript and returns their outputs in order.
+    With a concurrent.futures executor the renderers run side by side, e.g. in a thread pool.
+    """
+    if executor is None:
+        return [renderer(transcript) for renderer in renderers]
+    futures = [executor.submit(renderer, transcript) for renderer in renderers]
+    return [future.result() for future in futures]
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+import metadata as meta
+
+""" Persistent Transcript Cache """
+
+CACHE_DIR_ENV = "TRANSCRIPT_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".transcript_uplink")
+DATABASE_NAME = "transcripts.sqlite3"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    digest TEXT NOT NULL,
+    build INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (digest, build)
+)
+"""
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+
+
+def database_path():
+    return os.path.join(cache_dir(), DATABASE_NAME)
+
+
+@contextmanager
+def open_database(path=None, schema=SCHEMA):
+    """ A connection to a database under the given schema that commits on success and is always closed """
+    path = path or database_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=5)
+    try:
+        with connection:
+            connection.executescript(schema)
+            yield connection
+    finally:
+        connection.close()
+
+
+def load(digest, path=None):
+    """
+    Returns the cached payload for a PDF content hash under the current pipeline build, or None.
+    The cache is best effort: an unreadable database is treated as a miss.
+    """
+    try:
+        with open_database(path) as connection:
+            row = connection.execute("SELECT payload FROM transcripts WHERE digest = ? AND build = ?",
+                                     (digest, meta.build_number)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE transcripts SET last_access = ? WHERE digest = ? AND build = ?",
+                               (time.time(), digest, meta.build_number))
+        return json.loads(row[0])
+    except (sqlite3.Error, OSError, ValueError):
+        return None
+
+
+def save(digest, payload, path=None, max_bytes=MAX_CACHE_BYTES):
+    """ Stores a payload and evicts the least recently used entries until the cache fits in max_bytes """
+    data = json.dumps(payload)
+    try:
+        with open_database(path) as connection:
+            connection.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?)",
+                               (digest, meta.build_number, data, len(data), time.time()))
+            # Entries written by other pipeline builds can never be read again
+            connection.execute("DELETE FROM transcripts WHERE build != ?", (meta.build_number,))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+            for old_digest, old_build, size in connection.execute(
+                    "SELECT digest, build, size FROM transcripts ORDER BY last_access").fetchall():
+                if total <= max_bytes:
+                    break
+                connection.execute("DELETE FROM transcripts WHERE digest = ? AND build = ?", (old_digest, old_build))
+                total -= size
+    except (sqlite3.Error, OSError):
+        pass
+
+
+def clear(path=None):
+    """ Removes every cached transcript """
+    with open_database(path) as connection:
+        connection.execute("DELETE FROM transcripts")
+        connection.commit()
+        connection.execute("VACUUM")
+
+
+def stats(path=None):
+    with open_database(path) as connection:
+        count, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+    return {'path': path or database_path(), 'transcripts': count, 'bytes': size}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the on-disk cache of parsed transcripts")
+    parser.add_argument("--clear", action="store_true", help="remove every cached transcript")
+    args = parser.parse_args(argv)
+    if args.clear:
+        clear()
+        print(f"cleared {database_path()}")
+    else:
+        cache_stats = stats()
+        print(f"{cache_stats['transcripts']} transcripts, {cache_stats['bytes'] / 1024:.0f} KiB in {cache_stats['path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import batch
+import pdf_cache as pc
+
+""" Watch Folders for Highlighted PDFs """
+
+QUIET_SECONDS = 1.0  # A PDF is processed once it has not changed for this long, so half-written saves are skipped
+POLL_SECONDS = 1.0  # How often the polling watcher rescans when inotify is not available
+IDLE_SECONDS = 1.0  # How long the loop sleeps with nothing pending
+DEFAULT_WORKERS = 2
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len, followed by len bytes of NUL padded name
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+def is_watched_pdf(path):
+    return path.lower().endswith('.pdf') and not os.path.basename(path).startswith('.')
+
+
+def scan_pdfs(directories):
+    """ {path: (size, mtime)} of every PDF directly inside the directories """
+    signatures = {}
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if is_watched_pdf(entry.name):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.is_file():
+                    signatures[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return signatures
+
+
+def file_signature(path):
+    """ (size, mtime) of a file, None once it is gone """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class InotifyWatcher:
+    """
+    Reports the files written or moved into the directories through Linux inotify, read through ctypes so no extra
+    package is needed. Raises OSError where inotify is not available.
+    """
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.directories = directories
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories_by_wd = {}
+        try:
+            for directory in directories:
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+                self.directories_by_wd[wd] = directory
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def wait(self, timeout):
+        """ Blocks up to timeout seconds, returns the set of paths that changed """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return set()
+        paths = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, every PDF may have changed
+                paths.update(scan_pdfs(self.directories))
+            elif name and wd in self.directories_by_wd:
+                paths.add(os.path.join(self.directories_by_wd[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """ Reports the PDFs whose size or mtime changed since the previous scan, one directory listing per interval """
+
+    def __init__(self, directories, interval=POLL_SECONDS):
+        self.directories = directories
+        self.interval = interval
+        self.signatures = scan_pdfs(directories)
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        signatures = scan_pdfs(self.directories)
+        changed = {path for path, signature in signatures.items() if self.signatures.get(path) != signature}
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories, polling=False, interval=POLL_SECONDS):
+    """ An inotify watcher where the platform has one, the polling watcher otherwise """
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories, interval)
+
+
+class FolderWatch:
+    """
+    Keeps the outputs beside every PDF of the watched directories up to date.
+
+    A changed PDF waits until it has kept the same size and mtime for the quiet period, so a save still being written
+    is never read. Its content hash is then compared with the one last processed, a touched but unchanged file is
+    skipped. A PDF is never processed twice at once: a change arriving while it is in flight waits for that run.
+    Runs go through batch.process_file on a bounded process pool.
+    """
+
+    def __init__(self, directories, workers=DEFAULT_WORKERS, deck=False, quiet=QUIET_SECONDS, polling=False,
+                 interval=POLL_SECONDS, log=print, witness=None):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.workers = workers
+        self.deck = deck
+        self.witness = witness  # None cites each PDF's file name
+        self.quiet = quiet
+        self.polling = polling
+        self.interval = interval
+        self.log = log
+        self.digests = {}  # path -> content hash of the version last processed
+        self.pending = {}  # path -> [time of the latest change, (size, mtime) then]
+        self.in_flight = {}  # path -> (future, content hash being processed)
+
+    def outputs_current(self, path):
+        """ Whether every output of a PDF exists and is newer than it, e.g. from before a restart """
+        pdf_mtime = os.path.getmtime(path)
+        outputs = batch.output_paths(path)
+        if not self.deck:
+            outputs = outputs[:2]
+        return all(os.path.exists(output) and os.path.getmtime(output) >= pdf_mtime for output in outputs)
+
+    def seed(self):
+        """ Queues the PDFs already in the folders, the ones with current outputs only have their hash recorded """
+        for path in scan_pdfs(self.directories):
+            try:
+                if self.outputs_current(path):
+                    self.digests[path] = pc.file_digest(path)
+                    continue
+            except OSError:
+                continue
+            self.note_change(path)
+
+    def note_change(self, path):
+        self.pending[path] = [time.monotonic(), file_signature(path)]
+
+    def submit_ready(self, executor):
+        """ Starts every pending PDF that has been quiet long enough and whose contents changed """
+        now = time.monotonic()
+        for path, (changed_at, signature) in list(self.pending.items()):
+            if path in self.in_flight:
+                continue
+            current = file_signature(path)
+            if current is None:
+                del self.pending[path]
+                continue
+            if current != signature:
+                # Still being written
+                self.pending[path] = [now, current]
+                continue
+            if now - changed_at < self.quiet:
+                continue
+            del self.pending[path]
+            try:
+                digest = pc.file_digest(path)
+            except OSError:
+                continue
+            if self.digests.get(path) == digest:
+                continue
+            future = executor.submit(batch.process_file, path, None, self.deck, self.witness)
+            self.in_flight[path] = (future, digest)
+
+    def collect_finished(self):
+        for path, (future, digest) in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[path]
+            try:
+                entry = future.result()
+            except Exception as err:
+                entry = {'status': 'failed', 'error': f"{type(err).__name__}: {err}"}
+            if entry['status'] == 'ok':
+                self.digests[path] = digest
+                self.log(f"processed {path} in {entry['seconds']:.2f}s")
+            else:
+                self.log(f"FAILED {path}: {entry['error']}")
+
+    def run(self, stop=None):
+        """ Watches until stop, a threading.Event, is set or the process is interrupted """
+        stop = stop or threading.Event()
+        watcher = open_watcher(self.directories, self.polling, self.interval)
+        self.log(f"watching {', '.join(self.directories)} ({type(watcher).__name__}, {self.workers} workers)")
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                self.seed()
+                while not stop.is_set():
+                    busy = self.pending or self.in_flight
+                    timeout = min(self.quiet, self.interval) / 2 if busy else IDLE_SECONDS
+                    for path in watcher.wait(timeout):
+                        if is_watched_pdf(path):
+                            self.note_change(path)
+                    self.submit_ready(executor)
+                    self.collect_finished()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format highlighted PDFs as they are saved into watched folders")
+    parser.add_argument("directories", nargs="+", help="folders to watch, outputs are written beside each PDF")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument("--quiet", type=float, default=QUIET_SECONDS,
+                        help="seconds a PDF has to stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true", help="poll the folders instead of using inotify")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between polling scans")
+    parser.add_argument("--pptx", action="store_true", help="also write a .pptx deck with one slide per highlight")
+    parser.add_argument("--witness", default=None,
+                        help="witness name the deck slides cite (default: each PDF's file name)")
+    args = parser.parse_args(argv)
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"not a directory: {directory}")
+    FolderWatch(args.directories, args.workers, args.pptx, args.quiet, args.poll, args.interval,
+                witness=args.witness).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+from bisect import bisect_left, bisect_right
+
+""" Spatial Index of a Page's Words """
+
+ROW_BUCKET_HEIGHT = 12.0  # Points, about one transcript line
+GUTTER_TOLERANCE = 2.0  # Points of slack around a line number when lining up the gutter column
+MIN_GUTTER_NUMBERS = 3
+MAX_LINE_NUMBER_DIGITS = 2
+MIN_NUMBER_GAP = 6.0  # Points between a line number and the testimony beside it, wider than any space between words
+
+
+def is_line_number(word):
+    return word[4].isdigit() and len(word[4]) <= MAX_LINE_NUMBER_DIGITS
+
+
+def find_gutter(words):
+    """
+    Indices of the words that make up the line-number gutter of a page.
+
+    Line numbers are short digit-only words stacked in one column, so their x-ranges overlap whether they are
+    right-aligned, left-aligned or padded. The column overlapped by the most such words wins, provided it lies left
+    of most of the text; a page number or a figure in the testimony never lines up often enough to be taken for it.
+    """
+    candidates = [(word[0] - GUTTER_TOLERANCE, word[2] + GUTTER_TOLERANCE, word_index)
+                  for word_index, word in enumerate(words)
+                  if is_line_number(word)]
+    if len(candidates) < MIN_GUTTER_NUMBERS:
+        return set()
+    gutter = []
+    for x0, x1, _ in candidates:
+        members = [word_index for other_x0, other_x1, word_index in candidates if other_x0 <= x1 and x0 <= other_x1]
+        if len(members) > len(gutter):
+            gutter = members
+    if len(gutter) < MIN_GUTTER_NUMBERS:
+        return set()
+    text_x0 = sorted(word[0] for word in words)
+    if max(words[word_index][2] for word_index in gutter) > text_x0[len(text_x0) // 2]:
+        return set()
+    return set(gutter)
+
+
+def find_row_numbers(words, row_height=ROW_BUCKET_HEIGHT):
+    """
+    Indices of the line numbers of a page with too few of them for a gutter column, e.g. a last page of one or two
+    lines: the short digit-only words that start their row and stand apart from the testimony after them.
+    """
+    half_row = row_height / 2
+    rows = []
+    for y, x0, word_index in sorted(((word[1] + word[3]) / 2, word[0], word_index)
+                                    for word_index, word in enumerate(words)):
+        if rows and y - rows[-1][0] <= half_row:
+            rows[-1][1].append((x0, word_index))
+        else:
+            rows.append((y, [(x0, word_index)]))
+    numbers = set()
+    for _, row_words in rows:
+        if len(row_words) < 2:
+            continue
+        row_words.sort()
+        first, second = words[row_words[0][1]], words[row_words[1][1]]
+        if is_line_number(first) and second[0] - first[2] >= MIN_NUMBER_GAP:
+            numbers.add(row_words[0][1])
+    return numbers
+
+
+class PageWordIndex:
+    """
+    Row-bucketed grid over the output of page.get_text("words").
+
+    Words are bucketed by the y-coordinate of their centre and each bucket is sorted by the x-coordinate of the
+    centre, so the words under a highlight quad are found with one bisect per bucket the quad overlaps.
+    """
+
+    def __init__(self, words, row_height=ROW_BUCKET_HEIGHT):
+        self.words = words
+        self.row_height = row_height
+        self._gutter = None
+        self._line_numbers = None
+        rows = {}
+        for word_index, word in enumerate(words):
+            x0, y0, x1, y1 = word[:4]
+            center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+            rows.setdefault(int(center_y // row_height), []).append((center_x, center_y, word_index))
+        self.rows = {}
+        for bucket, entries in rows.items():
+            entries.sort()
+            self.rows[bucket] = ([entry[0] for entry in entries], entries)
+
+    def words_in_rect(self, x0, y0, x1, y1):
+        """ Indices of the words whose centre lies inside the rectangle """
+        found = []
+        for bucket in range(int(y0 // self.row_height), int(y1 // self.row_height) + 1):
+            row = self.rows.get(bucket)
+            if row is None:
+                continue
+            centers_x, entries = row
+            for center_x, center_y, word_index in entries[bisect_left(centers_x, x0):bisect_right(centers_x, x1)]:
+                if y0 <= center_y <= y1:
+                    found.append(word_index)
+        return found
+
+    @property
+    def gutter(self):
+        """ Indices of the line-number words, found on first use """
+        if self._gutter is None:
+            self._gutter = find_gutter(self.words)
+        return self._gutter
+
+    @property
+    def line_numbers(self):
+        """ Indices of the words numbering the lines: the gutter, or the row numbers of a page too short for one """
+        if self._line_numbers is None:
+            self._line_numbers = self.gutter or find_row_numbers(self.words, self.row_height)
+        return self._line_numbers
+
+    def numbered_rows(self, rects):
+        """
+        Rows of the text covered by any of the rectangles as (line_number, text) pairs in top to bottom order,
+        line_number being None for a row with no number beside it.
+
+        Rows are formed from the y-coordinates of the words and each row takes the line number on its y in one merge
+        pass over both lists sorted by y. The text order PyMuPDF emits the gutter in does not matter, and the number
+        does not have to lie under the highlight.
+        """
+        word_indices = set()
+        for rect in rects:
+            word_indices.update(self.words_in_rect(*rect))
+        gutter = self.line_numbers
+        half_row = self.row_height / 2
+        words = self.words
+
+        def center_y(word):
+            return (word[1] + word[3]) / 2
+
+        # (y, x0, text) of the highlighted words that are not line numbers, grouped into rows by y
+        selected = sorted((center_y(words[word_index]), words[word_index][0], words[word_index][4])
+                          for word_index in word_indices if word_index not in gutter)
+        rows = []
+        for y, x0, text in selected:
+            if rows and y - rows[-1][0] <= half_row:
+                rows[-1][1].append((x0, text))
+            else:
+                rows.append((y, [(x0, text)]))
+
+        numbers = sorted((center_y(words[word_index]), int(words[word_index][4])) for word_index in gutter)
+        numbered = []
+        next_number = 0
+        for y, row_words in rows:
+            while next_number < len(numbers) and numbers[next_number][0] < y - half_row:
+                next_number += 1
+            line_number = None
+            if next_number < len(numbers) and numbers[next_number][0] <= y + half_row:
+                line_number = numbers[next_number][1]
+            row_words.sort()
+            numbered.append((line_number, " ".join(text for _, text in row_words)))
+        return numbered
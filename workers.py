@@ -0,0 +1,54 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+""" Background Processing Workers """
+
+
+class WorkerSignals(QObject):
+    """ Signals a worker uses to hand its result back to the GUI thread """
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    progress = pyqtSignal(int, object)
+
+
+class Worker(QRunnable):
+    """
+    Runs a function on a QThreadPool thread and emits its result tagged with the generation it was started for,
+    so the receiver can drop results that were overtaken by newer input.
+    """
+
+    def __init__(self, generation, fn, *args):
+        super().__init__()
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as err:
+            self.signals.failed.emit(self.generation, str(err))
+            return
+        self.signals.finished.emit(self.generation, result)
+
+
+class ProgressWorker(Worker):
+    """
+    A Worker whose function reports progress while it runs: it is called with a progress=callback keyword, and
+    every call of the callback is emitted as a progress signal carrying the callback's arguments as a tuple.
+    """
+
+    def __init__(self, generation, fn, *args, **kwargs):
+        super().__init__(generation, fn, *args)
+        self.kwargs = kwargs
+
+    def report_progress(self, *payload):
+        self.signals.progress.emit(self.generation, payload)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self.report_progress, **self.kwargs)
+        except Exception as err:
+            self.signals.failed.emit(self.generation, str(err))
+            return
+        self.signals.finished.emit(self.generation, result)